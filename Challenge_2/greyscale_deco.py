@@ -1,14 +1,82 @@
 from functools import wraps
 
+BAND_ROWS = 64
 
-def greyscale(func):
-    @wraps(func)
-    def wrapper(matrix):
-        res = func(matrix)
-        for row in res:
-            for ind, pix in enumerate(row):
-                greysc = sum(pix) / len(pix)
-                new_pix = tuple([int(greysc) for i in range(len(pix))])
-                row[ind] = new_pix
-        return res
-    return wrapper
+# Weighted formulas round to the nearest level; truncating would darken
+# neutral greys whose weighted sum lands just below the integer.
+FORMULAS = {
+    'mean': None,
+    'bt601': (0.299, 0.587, 0.114),
+    'bt709': (0.2126, 0.7152, 0.0722),
+}
+
+
+def greyscale(func=None, *, formula='mean', in_place=True,
+              single_channel=False):
+    if formula not in FORMULAS:
+        raise ValueError('Unknown greyscale formula {}'.format(formula))
+    weights = FORMULAS[formula]
+
+    def deco(func):
+        @wraps(func)
+        def wrapper(matrix):
+            res = func(matrix)
+            if is_buffer(res):
+                return greyscale_buffer(res, weights, in_place,
+                                        single_channel)
+            if not in_place:
+                res = [list(row) for row in res]
+            for row in res:
+                for ind, pix in enumerate(row):
+                    if weights is None:
+                        greysc = int(sum(pix) / len(pix))
+                    else:
+                        greysc = int(weights[0]*pix[0] + weights[1]*pix[1] +
+                                     weights[2]*pix[2] + 0.5)
+                    if single_channel:
+                        row[ind] = greysc
+                    else:
+                        row[ind] = tuple([greysc for i in range(len(pix))])
+            return res
+        return wrapper
+
+    if func is not None:
+        return deco(func)
+    return deco
+
+
+def is_buffer(obj):
+    try:
+        memoryview(obj)
+    except TypeError:
+        return False
+    return True
+
+
+def greyscale_buffer(res, weights=None, in_place=True, single_channel=False):
+    import numpy as np
+
+    arr = np.asarray(res)
+    if single_channel:
+        out = np.empty(arr.shape[:-1], dtype=arr.dtype)
+    elif in_place and arr.flags.writeable:
+        out = arr
+    else:
+        out = np.empty_like(arr)
+    # Converted a band of rows at a time, so the float working planes stay
+    # small next to the image instead of adding full-size copies of it.
+    for start in range(0, len(arr), BAND_ROWS):
+        band = arr[start:start + BAND_ROWS]
+        if weights is None:
+            grey = band.sum(axis=-1) / band.shape[-1]
+        else:
+            grey = (weights[0]*band[..., 0] + weights[1]*band[..., 1] +
+                    weights[2]*band[..., 2] + 0.5)
+        if single_channel:
+            out[start:start + BAND_ROWS] = grey
+        else:
+            out[start:start + BAND_ROWS] = grey[..., np.newaxis]
+    if out is arr:
+        # asarray copies buffers it cannot view, which then hold the result.
+        return res if np.shares_memory(arr, res) else arr
+    return out
@@ -0,0 +1,107 @@
+import unittest
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from greyscale_deco import greyscale
+
+
+def identity(matrix):
+    return matrix
+
+
+class TestGreyscale(unittest.TestCase):
+    def setUp(self):
+        self.image = [[(10, 200, 30), (100, 100, 100)],
+                      [(0, 0, 0), (255, 255, 255)]]
+
+    def test_formulas(self):
+        expected = {'mean': 80, 'bt601': 124, 'bt709': 147}
+        for formula, grey in expected.items():
+            result = greyscale(formula=formula)(identity)(
+                [list(row) for row in self.image])
+            self.assertEqual(result[0][0], (grey,) * 3)
+            self.assertEqual(result[0][1], (100, 100, 100))
+            self.assertEqual(result[1], [(0, 0, 0), (255, 255, 255)])
+        with self.assertRaises(ValueError):
+            greyscale(formula='luma')
+
+    def test_default_decorator(self):
+        @greyscale
+        def load(matrix):
+            return matrix
+        self.assertEqual(load.__name__, 'load')
+        self.assertEqual(load([[(10, 200, 30)]]), [[(80, 80, 80)]])
+
+    def test_in_place(self):
+        image = [list(row) for row in self.image]
+        result = greyscale(identity)(image)
+        self.assertIs(result, image)
+        self.assertEqual(image[0][0], (80, 80, 80))
+
+    def test_tuple_of_rows(self):
+        image = tuple(list(row) for row in self.image)
+        result = greyscale(identity)(image)
+        self.assertIs(result, image)
+        self.assertEqual(image[0][0], (80, 80, 80))
+
+    def test_copy(self):
+        image = [list(row) for row in self.image]
+        result = greyscale(in_place=False)(identity)(image)
+        self.assertEqual(image, self.image)
+        self.assertEqual(result[0][0], (80, 80, 80))
+
+    def test_single_channel(self):
+        result = greyscale(formula='bt601', single_channel=True)(identity)(
+            [list(row) for row in self.image])
+        self.assertEqual(result, [[124, 100], [0, 255]])
+
+
+@unittest.skipUnless(numpy, 'numpy is not installed')
+class TestGreyscaleArrays(unittest.TestCase):
+    def setUp(self):
+        self.image = numpy.array([[(10, 200, 30), (100, 100, 100)],
+                                  [(0, 0, 0), (255, 255, 255)]],
+                                 dtype=numpy.uint8)
+
+    def test_formulas(self):
+        expected = {'mean': 80, 'bt601': 124, 'bt709': 147}
+        for formula, grey in expected.items():
+            result = greyscale(formula=formula, in_place=False)(identity)(
+                self.image)
+            self.assertEqual(result.dtype, numpy.uint8)
+            self.assertEqual(result[0, 0].tolist(), [grey] * 3)
+            self.assertEqual(result[0, 1].tolist(), [100] * 3)
+            self.assertEqual(result[1].tolist(), [[0] * 3, [255] * 3])
+
+    def test_in_place(self):
+        image = self.image.copy()
+        result = greyscale(identity)(image)
+        self.assertIs(result, image)
+        self.assertEqual(image[0, 0].tolist(), [80] * 3)
+
+    def test_copy(self):
+        image = self.image.copy()
+        result = greyscale(in_place=False)(identity)(image)
+        numpy.testing.assert_array_equal(image, self.image)
+        self.assertEqual(result.shape, image.shape)
+        self.assertEqual(result[0, 0].tolist(), [80] * 3)
+
+    def test_read_only_buffer(self):
+        image = self.image.copy()
+        image.flags.writeable = False
+        result = greyscale(identity)(image)
+        self.assertIsNot(result, image)
+        numpy.testing.assert_array_equal(image, self.image)
+
+    def test_single_channel(self):
+        result = greyscale(formula='bt601', single_channel=True)(identity)(
+            self.image)
+        self.assertEqual(result.shape, (2, 2))
+        self.assertEqual(result.tolist(), [[124, 100], [0, 255]])
+
+
+if __name__ == '__main__':
+    unittest.main()
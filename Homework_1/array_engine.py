@@ -0,0 +1,110 @@
+from functools import lru_cache, wraps
+
+import numpy as np
+
+from solution import EXIF_ORIENTATIONS, lookup_table
+
+
+def as_array(img):
+    arr = np.asarray(img)
+    if arr.ndim != 3:
+        raise ValueError('Expected an (H, W, channels) image, '
+                         'got shape {}'.format(arr.shape))
+    return arr
+
+
+def to_array(img):
+    return np.array(img, dtype=np.uint8).reshape(len(img), -1, 3)
+
+
+def to_pixels(arr):
+    return [[tuple(pix) for pix in row] for row in arr.tolist()]
+
+
+def orient(arr, turns=0, flipped=False):
+    if flipped:
+        arr = arr[:, ::-1]
+    return np.rot90(arr, turns)
+
+
+def rotate(arr, turns):
+    return np.rot90(arr, turns)
+
+
+def rotate_left(arr):
+    return np.rot90(arr)
+
+
+def rotate_right(arr):
+    return np.rot90(arr, -1)
+
+
+def rotate_180(arr):
+    return arr[::-1, ::-1]
+
+
+def flip_horizontal(arr):
+    return arr[:, ::-1]
+
+
+def flip_vertical(arr):
+    return arr[::-1]
+
+
+def exif_orient(arr, orientation):
+    return orient(arr, *EXIF_ORIENTATIONS[orientation])
+
+
+def invert(arr):
+    return _array_table('invert')[arr]
+
+
+def lighten(arr, coef):
+    return _array_table('lighten', coef)[arr]
+
+
+def darken(arr, coef):
+    return _array_table('darken', coef)[arr]
+
+
+@lru_cache(maxsize=256)
+def _array_table(operation, coef=None):
+    return np.array(lookup_table(operation, coef), dtype=np.uint8)
+
+
+def create_histogram(arr, region=None, step=1, dense=False):
+    if region is not None:
+        left, top, right, bottom = region
+        arr = arr[top:bottom, left:right]
+    arr = arr[::step, ::step, :3]
+    # One bincount over all channels, each shifted into its own 256 bins.
+    shifted = arr.astype(np.intp) + np.arange(0, 768, 256)
+    bins = np.bincount(shifted.ravel(), minlength=768).reshape(3, 256)
+
+    keys = ('red', 'green', 'blue')
+    if dense:
+        return dict(zip(keys, bins.tolist()))
+    return {key: {int(value): int(counts[value])
+                  for value in np.flatnonzero(counts)}
+            for key, counts in zip(keys, bins)}
+
+
+def apply_tables(arr, before, after, orientation):
+    arr = np.array(before, dtype=np.uint8)[arr]
+    if after is not None:
+        # Summed in uint16 and floor-divided in place: one small working
+        # plane instead of int64 and float64 copies of the image.
+        grey = arr.sum(axis=-1, dtype=np.uint16)
+        grey //= arr.shape[-1]
+        arr[...] = np.array(after, dtype=np.uint8)[grey][..., np.newaxis]
+    return orient(arr, *orientation)
+
+
+def on_pixels(operation):
+    @wraps(operation)
+    def wrapper(img, *args):
+        result = operation(to_array(img), *args)
+        if isinstance(result, np.ndarray):
+            return to_pixels(result)
+        return result
+    return wrapper
@@ -0,0 +1,122 @@
+import argparse
+import functools
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+import render
+
+
+def operation_spec(spec):
+    name, *args = spec.split(':')
+    if name not in render.OPERATIONS:
+        raise argparse.ArgumentTypeError(
+            "invalid operation '{}' (choose from {})".format(
+                name, ', '.join(render.OPERATIONS)))
+    return name, [float(arg) for arg in args]
+
+
+parser = argparse.ArgumentParser(
+    description='Run the homework operations over many images.')
+parser.add_argument('source', type=str,
+                    help="Directory of JPEG files or a glob pattern")
+parser.add_argument('operations', nargs='+', type=operation_spec,
+                    help="Operations to run on every image, with arguments "
+                         "separated by colons, e.g. lighten:0.5")
+parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                    help="Number of worker processes")
+parser.add_argument('--band-height', type=int, default=None,
+                    help="Process every image in horizontal bands of this "
+                         "many rows.")
+parser.add_argument('--buffer', action='store_true',
+                    help="Hand the operations the raw pixel buffers.")
+parser.add_argument('--output-dir', type=str, default=None,
+                    help="Directory to write the results to instead of "
+                         "next to every source image.")
+
+
+def find_images(source):
+    if os.path.isdir(source):
+        source = os.path.join(source, '*.jp*g')
+    return sorted(glob.glob(source))
+
+
+def split_outputs(paths, operations):
+    # Results written next to their sources are found again by the next
+    # run. Only files this run would itself write for another source are
+    # set aside, so a photo merely named like a result is still processed.
+    outputs = {os.path.normpath(output_name(path, operation, args))
+               for path in paths for operation, args in operations}
+    sources = [path for path in paths
+               if os.path.normpath(path) not in outputs]
+    return sources, [path for path in paths
+                     if os.path.normpath(path) in outputs]
+
+
+def output_name(path, operation, args, output_dir=None):
+    stem = os.path.splitext(path)[0]
+    if output_dir is not None:
+        stem = os.path.join(output_dir, os.path.basename(stem))
+    suffix = ''.join('_{:g}'.format(arg) for arg in args)
+    return '{}_{}{}.jpg'.format(stem, operation, suffix)
+
+
+def process_file(path, operations, band_height=None, buffer=False,
+                 output_dir=None):
+    # A broken file is reported back instead of raised, so it does not
+    # abort the rest of the batch.
+    start = time.perf_counter()
+    try:
+        with Image.open(path) as image:
+            for operation, args in operations:
+                result = render.process(image, operation, args, band_height,
+                                        buffer)
+                render.save(result, operation,
+                            output_name(path, operation, args, output_dir))
+    except Exception as exc:
+        return path, time.perf_counter() - start, exc
+    return path, time.perf_counter() - start, None
+
+
+def run_batch(paths, operations, workers=None, band_height=None,
+              buffer=False, output_dir=None):
+    worker = functools.partial(process_file, operations=operations,
+                               band_height=band_height, buffer=buffer,
+                               output_dir=output_dir)
+    chunksize = max(1, len(paths) // (4 * (workers or os.cpu_count() or 1)))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(worker, paths, chunksize=chunksize)
+
+
+def main():
+    args = parser.parse_args()
+    paths = find_images(args.source)
+    if not paths:
+        parser.error("no images found in {}".format(args.source))
+
+    if args.output_dir is None:
+        paths, skipped = split_outputs(paths, args.operations)
+        for path in skipped:
+            print("{}: skipped, it is a result of this run".format(path))
+    else:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    start, failed = time.perf_counter(), 0
+    for path, seconds, error in run_batch(paths, args.operations,
+                                          args.workers, args.band_height,
+                                          args.buffer, args.output_dir):
+        if error is None:
+            print("{}: {:.3f}s".format(path, seconds))
+        else:
+            failed += 1
+            print("{}: failed: {}".format(path, error))
+    elapsed = time.perf_counter() - start
+    print("Processed {} images in {:.2f}s ({:.1f} images/sec), {} failed"
+          .format(len(paths), elapsed, len(paths) / elapsed, failed))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,50 +1,208 @@
 import argparse
+import time
+from contextlib import contextmanager
 
-from PIL import Image
-from matplotlib import pyplot
-
-import solution
+OPERATIONS = ['create_histogram', 'lighten', 'darken',
+              'invert', 'rotate_left', 'rotate_right', 'rotate_180',
+              'flip_horizontal', 'flip_vertical']
+ROTATIONS = ('rotate_left', 'rotate_right')
 
 parser = argparse.ArgumentParser(description='Visualize your homework.')
 parser.add_argument('file', type=str, help="JPEG file to manipulate")
-parser.add_argument('operation',
-                    choices=['create_histogram', 'lighten', 'darken',
-                             'invert', 'rotate_left', 'rotate_right'],
+parser.add_argument('operation', choices=OPERATIONS,
                     help="Operation to be executed on given image.")
 parser.add_argument('args', default=[], nargs="*", type=float,
                     help="Opearion arguments")
+parser.add_argument('--band-height', type=int, default=None,
+                    help="Run the operation on horizontal bands of this "
+                         "many rows instead of the whole pixel list. This "
+                         "bounds the Python pixel lists only: the decoded "
+                         "source and the output image are still held in "
+                         "full.")
+parser.add_argument('--buffer', action='store_true',
+                    help="Hand the operation the raw pixel buffer as a NumPy "
+                         "array instead of lists of pixel tuples.")
+parser.add_argument('--timings', action='store_true',
+                    help="Report the time spent on importing, decoding, "
+                         "the operation and encoding.")
 
-args = parser.parse_args()
 
-image = Image.open(args.file)
-pixels = list(image.getdata())
-picture = []
-for h in range(image.size[1]):
-    picture.append(pixels[(h*image.size[0]):((h+1)*image.size[0])])
+def load_modules():
+    # PIL and the homework are imported on first use, so the import phase
+    # of --timings measures them alone.
+    from PIL import Image
+    import solution
+    return Image, solution
 
-try:
-    operation_result = getattr(solution, args.operation)(picture, *args.args)
-    filename = '{}_{}.jpg'.format(args.file.split('.')[0], args.operation)
-except Exception as exc:
-    print("There's something wrong with your implementation of "
-          "{0}()!\n".format(args.operation))
-    raise exc
 
-if args.operation == 'create_histogram':
-    for color, histogram in operation_result.items():
-        pyplot.bar(histogram.keys(), histogram.values(), alpha=0.6,
-                   color=color)
+def read_rows(image, box):
+    left, top, right, bottom = box
+    pixels = list(image.crop(box).getdata())
+    width = right - left
+    return [pixels[(h*width):((h+1)*width)] for h in range(bottom - top)]
+
+
+def write_rows(image, rows, position):
+    Image = load_modules()[0]
+    tile = Image.new('RGB', (len(rows[0]), len(rows)))
+    tile.putdata([pixel for row in rows for pixel in row])
+    image.paste(tile, position)
+
+
+def tile_position(operation, size, box):
+    width, height = size
+    left, top, right, bottom = box
+    if operation == 'rotate_left':
+        return (top, width - right)
+    if operation == 'rotate_right':
+        return (height - bottom, left)
+    if operation == 'rotate_180':
+        return (width - right, height - bottom)
+    if operation == 'flip_horizontal':
+        return (width - right, top)
+    if operation == 'flip_vertical':
+        return (left, height - bottom)
+    return (left, top)
+
+
+def stream_histogram(image, band_height):
+    solution = load_modules()[1]
+    width, height = image.size
+    bins = [[0] * 256 for key in ('red', 'green', 'blue')]
+    for top in range(0, height, band_height):
+        box = (0, top, width, min(top + band_height, height))
+        band = solution.create_histogram(read_rows(image, box), dense=True)
+        for total, counts in zip(bins, band.values()):
+            for value, count in enumerate(counts):
+                total[value] += count
+    return {key: {value: count for value, count in enumerate(counts) if count}
+            for key, counts in zip(('red', 'green', 'blue'), bins)}
+
+
+def stream_operation(image, operation, args, band_height):
+    # Rotations turn a band of rows into a band of columns, so they are
+    # processed in square tiles that are transposed and pasted one by one.
+    Image, solution = load_modules()
+    width, height = image.size
+    if operation in ROTATIONS:
+        new_image = Image.new('RGB', (height, width))
+        tile_width = band_height
+    else:
+        new_image = Image.new('RGB', image.size)
+        tile_width = width
+
+    function = getattr(solution, operation)
+    for top in range(0, height, band_height):
+        bottom = min(top + band_height, height)
+        for left in range(0, width, tile_width):
+            box = (left, top, min(left + tile_width, width), bottom)
+            rows = function(read_rows(image, box), *args)
+            write_rows(new_image, rows,
+                       tile_position(operation, image.size, box))
+    return new_image
+
+
+def run_operation(image, operation, args):
+    Image, solution = load_modules()
+    picture = read_rows(image, (0, 0) + image.size)
+    result = getattr(solution, operation)(picture, *args)
+    if operation == 'create_histogram':
+        return result
 
-    pyplot.savefig(filename)
-else:
-    new_pixels = [pixel for row in operation_result for pixel in row]
     new_image = None
-    if args.operation in ('rotate_left', 'rotate_right'):
+    if operation in ROTATIONS:
         new_image = Image.new('RGB', (image.size[1], image.size[0]))
     else:
         new_image = Image.new('RGB', image.size)
-    new_image.putdata(new_pixels)
-    new_image.save(filename, 'JPEG')
+    new_image.putdata([pixel for row in result for pixel in row])
+    return new_image
+
+
+def run_buffer_operation(image, operation, args):
+    import numpy as np
+    Image, solution = load_modules()
+
+    result = getattr(solution, operation)(np.asarray(image), *args)
+    if operation == 'create_histogram':
+        return result
+    return Image.fromarray(np.ascontiguousarray(result))
+
+
+def process(image, operation, args, band_height=None, buffer=False):
+    if buffer:
+        return run_buffer_operation(image, operation, args)
+    if band_height and operation == 'create_histogram':
+        return stream_histogram(image, band_height)
+    if band_height:
+        return stream_operation(image, operation, args, band_height)
+    return run_operation(image, operation, args)
+
+
+def load_pyplot():
+    # matplotlib is only needed for histograms and is slow to import, so it
+    # is loaded on first use with a backend that never touches a display.
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib import pyplot
+    return pyplot
+
+
+@contextmanager
+def timed(timings, phase):
+    start = time.perf_counter()
+    yield
+    timings[phase] = timings.get(phase, 0) + time.perf_counter() - start
+
+
+def save_histogram(histograms, filename):
+    pyplot = load_pyplot()
+    figure = pyplot.figure()
+    for color, histogram in histograms.items():
+        pyplot.bar(histogram.keys(), histogram.values(), alpha=0.6,
+                   color=color)
+
+    figure.savefig(filename)
+    pyplot.close(figure)
+
+
+def save(operation_result, operation, filename):
+    if operation == 'create_histogram':
+        save_histogram(operation_result, filename)
+    else:
+        operation_result.save(filename, 'JPEG')
+
+
+def main():
+    args = parser.parse_args()
+    timings = {}
+
+    with timed(timings, 'import'):
+        Image = load_modules()[0]
+    with timed(timings, 'decode'):
+        image = Image.open(args.file)
+        image.load()
+    try:
+        with timed(timings, 'operation'):
+            operation_result = process(image, args.operation, args.args,
+                                       args.band_height, args.buffer)
+        filename = '{}_{}.jpg'.format(args.file.split('.')[0],
+                                      args.operation)
+    except Exception as exc:
+        print("There's something wrong with your implementation of "
+              "{0}()!\n".format(args.operation))
+        raise exc
+
+    if args.operation == 'create_histogram':
+        with timed(timings, 'import'):
+            load_pyplot()
+    with timed(timings, 'encode'):
+        save(operation_result, args.operation, filename)
+    print("File saved as {}".format(filename))
+
+    if args.timings:
+        for phase in ('import', 'decode', 'operation', 'encode'):
+            print("{:>9}: {:.3f}s".format(phase, timings[phase]))
 
 
-print("File saved as {}".format(filename))
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,15 @@
 import unittest
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
 import solution
 
 
@@ -19,6 +29,16 @@ class TestImages(unittest.TestCase):
             for j in range(len(expected[0])):
                 self.assertEqual(expected[i][j], rotated[i][j])
 
+    def test_rotate_right(self):
+        rotated = solution.rotate_right(self.image)
+        expected = [[(0, 255, 0), (255, 0, 0), (0, 0, 255)],
+                    [(0, 255, 0), (0, 0, 255), (0, 255, 0)],
+                    [(255, 0, 0), (0, 255, 0), (0, 0, 255)]]
+
+        for i in range(len(expected)):
+            for j in range(len(expected[0])):
+                self.assertEqual(expected[i][j], rotated[i][j])
+
     def test_lighten(self):
         lighten = solution.lighten(self.image, 0.5)
         expected = [[(127, 127, 255), (127, 255, 127), (127, 127, 255)],
@@ -39,6 +59,28 @@ class TestImages(unittest.TestCase):
             for j in range(len(expected[0])):
                 self.assertEqual(expected[i][j], inverted[i][j])
 
+    def test_translate_raw_buffer(self):
+        raw = bytes(el for row in self.image for pix in row for el in pix)
+        lightened = solution.lighten(self.image, 0.5)
+        self.assertEqual(
+            solution.translate(memoryview(raw), 'lighten', 0.5),
+            bytes(el for row in lightened for pix in row for el in pix))
+        self.assertIs(solution.lookup_table('lighten', 0.5),
+                      solution.lookup_table('lighten', 0.5))
+
+    def test_coefficient_out_of_range(self):
+        for coef in (-0.1, 1.5):
+            with self.assertRaises(ValueError):
+                solution.lighten(self.image, coef)
+            with self.assertRaises(ValueError):
+                solution.darken(self.image, coef)
+            with self.assertRaises(ValueError):
+                solution.translate(b'abc', 'lighten', coef)
+            with self.assertRaises(ValueError):
+                solution.Pipeline().darken(coef).invert()
+        self.assertEqual(solution.lighten(self.image, 1)[0][0],
+                         (255, 255, 255))
+
     def test_create_histogram(self):
         self.assertEqual(
             solution.create_histogram(self.image),
@@ -46,6 +88,180 @@ class TestImages(unittest.TestCase):
              'green': {0: 5, 255: 4},
              'red': {0: 7, 255: 2}})
 
+    def test_create_histogram_region_and_step(self):
+        self.assertEqual(
+            solution.create_histogram(self.image, region=(1, 0, 3, 2)),
+            {'blue': {0: 2, 255: 2},
+             'green': {0: 2, 255: 2},
+             'red': {0: 4}})
+        self.assertEqual(
+            solution.create_histogram(self.image, step=2),
+            {'blue': {0: 2, 255: 2},
+             'green': {0: 3, 255: 1},
+             'red': {0: 3, 255: 1}})
+        dense = solution.create_histogram(self.image, dense=True)
+        self.assertEqual(len(dense['red']), 256)
+        self.assertEqual(dense['red'][255], 2)
+
+
+class TestOrientation(unittest.TestCase):
+    image = [[(row, col, 0) for col in range(3)] for row in range(70)]
+
+    def test_flips_and_half_turn(self):
+        self.assertEqual(solution.flip_horizontal(self.image),
+                         [row[::-1] for row in self.image])
+        self.assertEqual(solution.flip_vertical(self.image),
+                         self.image[::-1])
+        self.assertEqual(solution.rotate_180(self.image),
+                         [row[::-1] for row in self.image[::-1]])
+        self.assertEqual(solution.rotate(self.image, -1),
+                         solution.rotate_right(self.image))
+
+    def test_exif_orientations(self):
+        transpose = [list(col) for col in zip(*self.image)]
+        expected = {
+            1: self.image,
+            2: solution.flip_horizontal(self.image),
+            3: solution.rotate_180(self.image),
+            4: solution.flip_vertical(self.image),
+            5: transpose,
+            6: solution.rotate_right(self.image),
+            7: solution.rotate_180(transpose),
+            8: solution.rotate_left(self.image),
+        }
+        for orientation, result in expected.items():
+            self.assertEqual(
+                solution.exif_orient(self.image, orientation), result)
+
+    def test_composed_orientations(self):
+        steps = ['rotate_left', 'flip_vertical', 'rotate_left',
+                 'flip_horizontal', 'rotate_180', 'rotate_right']
+        pipeline = solution.Pipeline()
+        expected = self.image
+        for step in steps:
+            getattr(pipeline, step)()
+            expected = getattr(solution, step)(expected)
+            self.assertEqual(pipeline.apply(self.image), expected)
+
+
+class TestPipeline(unittest.TestCase):
+    image = [[(10, 20, 30), (40, 50, 60), (70, 80, 90)],
+             [(100, 110, 120), (130, 140, 150), (160, 170, 180)]]
+
+    def test_fuses_pixel_operations_and_rotations(self):
+        pipeline = (solution.Pipeline().invert().darken(0.3).rotate_left()
+                    .lighten(0.2).rotate_left().rotate_left())
+        expected = solution.rotate_right(solution.lighten(
+            solution.darken(solution.invert(self.image), 0.3), 0.2))
+        self.assertEqual([list(row) for row in expected],
+                         pipeline.apply(self.image))
+
+    def test_greyscale(self):
+        pipeline = solution.Pipeline().lighten(0.5).greyscale().invert()
+        expected = [[(255 - int(sum(pix) / len(pix)),) * 3 for pix in row]
+                    for row in solution.lighten(self.image, 0.5)]
+        self.assertEqual(expected, pipeline.apply(self.image))
+
+    def test_half_turn(self):
+        pipeline = solution.Pipeline().rotate_right().rotate_right()
+        self.assertEqual([row[::-1] for row in self.image[::-1]],
+                         pipeline.apply(self.image))
+
+
+@unittest.skipUnless(numpy, 'numpy is not installed')
+class TestArrayEngine(unittest.TestCase):
+    image = [[(value, (value * 7) % 256, 255 - value) for value in row]
+             for row in ([0, 1, 2, 127, 128], [200, 253, 254, 255, 3])]
+
+    def test_matches_pixel_operations(self):
+        import array_engine
+        for name, args in [('rotate_left', ()), ('rotate_right', ()),
+                           ('invert', ()), ('lighten', (0.3,)),
+                           ('lighten', (0.5,)), ('darken', (0.7,)),
+                           ('create_histogram', ()),
+                           ('create_histogram', ((1, 0, 4, 2), 2))]:
+            expected = getattr(solution, name)(self.image, *args)
+            result = array_engine.on_pixels(
+                getattr(array_engine, name))(self.image, *args)
+            if name != 'create_histogram':
+                expected = [list(row) for row in expected]
+            self.assertEqual(expected, result)
+
+    def test_dense_histogram(self):
+        import array_engine
+        dense = solution.create_histogram(self.image, dense=True)
+        result = array_engine.create_histogram(
+            array_engine.to_array(self.image), dense=True)
+        self.assertEqual(result, dense)
+        self.assertIsInstance(result['red'], list)
+
+    def test_buffers_stay_buffers(self):
+        import array_engine
+        arr = array_engine.to_array(self.image)
+        for img in (arr, memoryview(arr)):
+            result = solution.lighten(img, 0.4)
+            self.assertIsInstance(result, numpy.ndarray)
+            self.assertEqual(array_engine.to_pixels(result),
+                             solution.lighten(self.image, 0.4))
+        pipeline = solution.Pipeline().invert().greyscale().rotate_left()
+        self.assertEqual(array_engine.to_pixels(pipeline.apply(arr)),
+                         pipeline.apply(self.image))
+
+
+@unittest.skipUnless(Image, 'PIL is not installed')
+class TestRender(unittest.TestCase):
+    # Non-square, with a band height that divides neither side.
+    size, band_height = (413, 257), 37
+
+    def setUp(self):
+        import random
+        rng = random.Random(5)
+        self.image = Image.frombytes(
+            'RGB', self.size,
+            bytes(rng.randrange(256) for i in range(3 * 413 * 257)))
+
+    def test_band_mode_matches_whole_image(self):
+        import render
+        for operation in render.OPERATIONS:
+            args = [0.3] if operation in ('lighten', 'darken') else []
+            whole = render.process(self.image, operation, args)
+            banded = render.process(self.image, operation, args,
+                                    band_height=self.band_height)
+            results = [banded]
+            if numpy is not None:
+                results.append(render.process(self.image, operation, args,
+                                              buffer=True))
+            for result in results:
+                if operation == 'create_histogram':
+                    self.assertEqual(result, whole)
+                else:
+                    self.assertEqual(result.size, whole.size)
+                    self.assertEqual(result.tobytes(), whole.tobytes())
+
+    def test_tile_position(self):
+        import render
+        box = (37, 74, 74, 111)
+        self.assertEqual(render.tile_position('rotate_left', self.size, box),
+                         (74, 339))
+        self.assertEqual(render.tile_position('rotate_right', self.size, box),
+                         (146, 37))
+        self.assertEqual(render.tile_position('invert', self.size, box),
+                         (37, 74))
+
+
+@unittest.skipUnless(Image, 'PIL is not installed')
+class TestBatch(unittest.TestCase):
+
+    def test_split_outputs(self):
+        import batch
+        operations = [('invert', []), ('lighten', [0.5])]
+        paths = ['b/a.jpg', 'b/a_invert.jpg', 'b/a_lighten_0.5.jpg',
+                 'b/beach_invert.jpg', 'b/c.jpeg', 'b/c_invert.jpg']
+        self.assertEqual(
+            batch.split_outputs(paths, operations),
+            (['b/a.jpg', 'b/beach_invert.jpg', 'b/c.jpeg'],
+             ['b/a_invert.jpg', 'b/a_lighten_0.5.jpg', 'b/c_invert.jpg']))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,51 +1,264 @@
-from collections import defaultdict
+from functools import lru_cache, wraps
 
 
+def accepts_buffers(func):
+    # Images exposing the buffer protocol (NumPy arrays, memoryviews shaped
+    # (H, W, channels)) go through array_engine without ever being turned
+    # into per-pixel Python objects; the result is an array as well.
+    @wraps(func)
+    def wrapper(img, *args, **kwargs):
+        if is_buffer(img):
+            import array_engine
+            operation = getattr(array_engine, func.__name__)
+            return operation(array_engine.as_array(img), *args, **kwargs)
+        return func(img, *args, **kwargs)
+    return wrapper
+
+
+def is_buffer(img):
+    try:
+        memoryview(img)
+    except TypeError:
+        return False
+    return True
+
+
+# An orientation is a pair (turns, flipped): mirror every row if flipped,
+# then rotate by the given number of quarter turns to the left.
+EXIF_ORIENTATIONS = {
+    1: (0, False),
+    2: (0, True),
+    3: (2, False),
+    4: (2, True),
+    5: (1, True),
+    6: (3, False),
+    7: (3, True),
+    8: (1, False),
+}
+
+
+def compose_orientations(first, second):
+    (first_turns, first_flipped), (turns, flipped) = first, second
+    if flipped:
+        return (turns - first_turns) % 4, not first_flipped
+    return (turns + first_turns) % 4, first_flipped
+
+
+@accepts_buffers
+def orient(img, turns=0, flipped=False, transform=None):
+    turns %= 4
+    if turns % 2 == 0:
+        rows = img[::-1] if turns == 2 else img
+        if flipped == (turns == 2):
+            return [list(map(transform, row)) if transform else list(row)
+                    for row in rows]
+        return [list(map(transform, reversed(row))) if transform
+                else row[::-1] for row in rows]
+
+    rotated = _transpose(img if turns == 1 else img[::-1], transform)
+    if flipped == (turns == 1):
+        return rotated
+    return rotated[::-1]
+
+
+def _transpose(img, transform=None, tile=64):
+    # zip(*img) walks one iterator per row for every output column, which
+    # thrashes on tall images; transposing bands of rows keeps that small.
+    columns = [[] for pix in (img[0] if img else ())]
+    for top in range(0, len(img), tile):
+        band = zip(*img[top:top + tile])
+        for column, part in zip(columns, band):
+            column.extend(map(transform, part) if transform else part)
+    return columns
+
+
+@accepts_buffers
+def rotate(img, turns):
+    return orient(img, turns)
+
+
+@accepts_buffers
 def rotate_left(img):
-    rotated = zip(*(r[::-1] for r in img))
-    return list(rotated)
+    return orient(img, 1)
 
 
+@accepts_buffers
 def rotate_right(img):
-    rotated = zip(*(r for r in img))
-    return list(rotated)
+    return orient(img, 3)
 
 
-def invert(img):
-    inverted = [[tuple([255 - el for el in pix])
-                for pix in row]
-                for row in img]
+@accepts_buffers
+def rotate_180(img):
+    return orient(img, 2)
 
-    return inverted
 
+@accepts_buffers
+def flip_horizontal(img):
+    return orient(img, 0, True)
 
-def lighten(img, coef):
-    lightened = [[tuple([int(el + coef*(255 - el)) for el in pix])
-                 for pix in row]
-                 for row in img]
 
-    return lightened
+@accepts_buffers
+def flip_vertical(img):
+    return orient(img, 2, True)
 
 
+@accepts_buffers
+def exif_orient(img, orientation):
+    return orient(img, *EXIF_ORIENTATIONS[orientation])
+
+
+@accepts_buffers
+def invert(img):
+    return _map_channels(img, lookup_table('invert'))
+
+
+@accepts_buffers
+def lighten(img, coef):
+    return _map_channels(img, lookup_table('lighten', coef))
+
+
+@accepts_buffers
 def darken(img, coef):
-    darkened = [[tuple([int(el - coef*(el - 0)) for el in pix])
-                for pix in row]
-                for row in img]
+    return _map_channels(img, lookup_table('darken', coef))
+
 
-    return darkened
+def translate(data, operation, coef=None):
+    if not isinstance(data, (bytes, bytearray)):
+        data = bytes(data)
+    return data.translate(_translation_table(operation, coef))
 
 
-def create_histogram(img):
-    histogram = {}
-    temp = defaultdict(int)
+@lru_cache(maxsize=256)
+def lookup_table(operation, coef=None):
+    # Every engine indexes or translates through these tables, so a
+    # coefficient outside [0, 1] is refused here rather than producing
+    # levels outside 0..255.
+    if operation == 'invert':
+        return tuple(255 - el for el in range(256))
+    if operation in ('lighten', 'darken') and not 0 <= coef <= 1:
+        raise ValueError('Coefficient must be between 0 and 1, got {}'
+                         .format(coef))
+    if operation == 'lighten':
+        return tuple(int(el + coef*(255 - el)) for el in range(256))
+    if operation == 'darken':
+        return tuple(int(el - coef*(el - 0)) for el in range(256))
+    raise ValueError('Unknown pixel operation {}'.format(operation))
+
+
+@lru_cache(maxsize=256)
+def _translation_table(operation, coef=None):
+    return bytes(lookup_table(operation, coef))
+
+
+def _map_channels(img, table):
+    return [[tuple([table[el] for el in pix]) for pix in row] for row in img]
+
+
+@accepts_buffers
+def create_histogram(img, region=None, step=1, dense=False):
+    if region is None:
+        region = (0, 0, len(img[0]) if img else 0, len(img))
+    left, top, right, bottom = region
+    bins = ([0] * 256, [0] * 256, [0] * 256)
+    red, green, blue = bins
+    for row in img[top:bottom:step]:
+        for pix in row[left:right:step]:
+            red[pix[0]] += 1
+            green[pix[1]] += 1
+            blue[pix[2]] += 1
+
     keys = ('red', 'green', 'blue')
-    for ind, key in enumerate(keys):
-        for row in img:
-            for pix in row:
-                temp[pix[ind]] += 1
-        histogram[key] = temp
-        temp = defaultdict(int)
-    return histogram
+    if dense:
+        return dict(zip(keys, bins))
+    return {key: {value: count for value, count in enumerate(counts) if count}
+            for key, counts in zip(keys, bins)}
+
+
+class Pipeline:
+
+    def __init__(self):
+        self.steps = []
+
+    def invert(self):
+        self.steps.append(('invert', None))
+        return self
+
+    def lighten(self, coef):
+        lookup_table('lighten', coef)
+        self.steps.append(('lighten', coef))
+        return self
+
+    def darken(self, coef):
+        lookup_table('darken', coef)
+        self.steps.append(('darken', coef))
+        return self
+
+    def greyscale(self):
+        self.steps.append(('greyscale', None))
+        return self
+
+    def rotate_left(self):
+        self.steps.append(('orient', (1, False)))
+        return self
+
+    def rotate_right(self):
+        self.steps.append(('orient', (3, False)))
+        return self
+
+    def rotate_180(self):
+        self.steps.append(('orient', (2, False)))
+        return self
+
+    def flip_horizontal(self):
+        self.steps.append(('orient', (0, True)))
+        return self
+
+    def flip_vertical(self):
+        self.steps.append(('orient', (2, True)))
+        return self
+
+    def exif_orient(self, orientation):
+        self.steps.append(('orient', EXIF_ORIENTATIONS[orientation]))
+        return self
+
+    def compile(self):
+        # Pixel operations commute with rotations and flips, so the whole
+        # pipeline reduces to a table before greyscale, a table after it and
+        # a single orientation.
+        before, after = tuple(range(256)), None
+        orientation = (0, False)
+        for name, arg in self.steps:
+            if name == 'orient':
+                orientation = compose_orientations(orientation, arg)
+            elif name == 'greyscale':
+                if after is None:
+                    after = tuple(range(256))
+            elif after is None:
+                before = _compose(before, lookup_table(name, arg))
+            else:
+                after = _compose(after, lookup_table(name, arg))
+        return before, after, orientation
+
+    def apply(self, img):
+        before, after, orientation = self.compile()
+        if is_buffer(img):
+            import array_engine
+            return array_engine.apply_tables(array_engine.as_array(img),
+                                             before, after, orientation)
+
+        if after is None:
+            def transform(pix):
+                return tuple([before[el] for el in pix])
+        else:
+            def transform(pix):
+                grey = sum([before[el] for el in pix]) / len(pix)
+                return (after[int(grey)],) * len(pix)
+
+        return orient(img, *orientation, transform=transform)
+
+
+def _compose(first, second):
+    return tuple(second[el] for el in first)
 
 
 def main():
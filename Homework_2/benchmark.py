@@ -0,0 +1,56 @@
+import sys
+import timeit
+
+import solution
+
+
+def evaluate_recursive(node, variables):
+    if not isinstance(node, solution.Expression):
+        return node.evaluate(**variables)
+    return node.operator(evaluate_recursive(node.lhs, variables),
+                         evaluate_recursive(node.rhs, variables))
+
+
+def deep_chain(length):
+    x = solution.create_variable('x')
+    expression = x
+    for i in range(length):
+        expression = expression + x * i
+    return expression
+
+
+def wide_tree(depth, leaf=0):
+    # Distinct leaves on every branch, so no subtree is shared.
+    if depth == 0:
+        return solution.create_variable('x') + leaf
+    return (wide_tree(depth - 1, 2 * leaf) *
+            wide_tree(depth - 1, 2 * leaf + 1))
+
+
+def measure(function, number):
+    try:
+        return '{:.6f}s'.format(timeit.timeit(function, number=number) /
+                                number)
+    except RecursionError:
+        return 'RecursionError'
+
+
+def main():
+    cases = [('deep chain, 500 terms', deep_chain(500)),
+             ('deep chain, {} terms'.format(2 * sys.getrecursionlimit()),
+              deep_chain(2 * sys.getrecursionlimit())),
+             ('deep chain, 100000 terms', deep_chain(100000)),
+             ('wide tree, depth 12', wide_tree(12))]
+    variables = {'x': 3}
+    print('{:<28} {:>16} {:>16}'.format('expression', 'recursive',
+                                        'iterative'))
+    for name, expression in cases:
+        number = max(1, 100000 // expression.node_count)
+        print('{:<28} {:>16} {:>16}'.format(
+            name,
+            measure(lambda: evaluate_recursive(expression, variables), number),
+            measure(lambda: expression.evaluate(**variables), number)))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,32 @@
-import collections
+import itertools
+import math
 import numbers
+import operator
+import re
+import weakref
+from collections.abc import Iterable
+from functools import lru_cache
+
+
+OPERATOR_FUNCTIONS = {
+    '+': operator.add,
+    '-': operator.sub,
+    '*': operator.mul,
+    '/': operator.truediv,
+    '//': operator.floordiv,
+    '%': operator.mod,
+}
+
+PRECEDENCE = {'+': 1, '-': 1, '*': 2, '/': 2, '//': 2, '%': 2}
 
 
 class DunderProvider:
 
+    __slots__ = ()
+
     @staticmethod
     def operator_factory(symbol):
-        oper_expr = 'Operator("{s}", lambda x, y: x {s} y)'.format(s=symbol)
-        return eval(oper_expr)
+        return Operator(symbol, OPERATOR_FUNCTIONS[symbol])
 
     def __add__(self, other):
         oper = DunderProvider.operator_factory('+')
@@ -56,7 +75,39 @@ class DunderProvider:
         return Expression((other, oper, self))
 
 
-class Constant(DunderProvider):
+class Leaf(DunderProvider):
+
+    # Constants and variables answer the whole Expression interface, so
+    # optimize(), derivative() and parse_expression() may return one.
+    __slots__ = ()
+    node_count = 1
+
+    def to_string(self, minimal_parentheses=False):
+        return str(self)
+
+    def postorder(self):
+        return []
+
+    def fold(self, leaf, combine):
+        return leaf(self)
+
+    def get_variable_names(self, names):
+        names.update(self._variable_names)
+        return names
+
+    def evaluate_batch(self, **variables):
+        columns = _batch_columns(variables)[0]
+        return _broadcast(self._evaluate(columns), columns)
+
+    def optimize(self, report=False):
+        return (self, 1, 1) if report else self
+
+    def evaluate_with_gradient(self, **variables):
+        return (self._evaluate(variables),
+                dict.fromkeys(self._variable_names, 1))
+
+
+class Constant(Leaf):
 
     '''
     def customize(self):
@@ -67,8 +118,27 @@ class Constant(DunderProvider):
         for d, o in zip(dunders, operators):
             Constant.__dict__[d] = Expression((constant.operator_factory(o)))
     '''
-    def __init__(self, value):
-        self.__value = value
+    __slots__ = ('__value', '__weakref__')
+    _instances = weakref.WeakValueDictionary()
+    variable_names = ()
+    _variable_names = frozenset()
+
+    def __new__(cls, value):
+        # 0.0 == -0.0 and both hash alike, so floats also key on their sign.
+        key = (type(value), value)
+        if isinstance(value, float):
+            key += (math.copysign(1, value),)
+        try:
+            return cls._instances[key]
+        except KeyError:
+            new_obj = super().__new__(cls)
+            new_obj.__value = value
+            cls._instances[key] = new_obj
+            return new_obj
+        except TypeError:
+            new_obj = super().__new__(cls)
+            new_obj.__value = value
+            return new_obj
 
     @property
     def value(self):
@@ -85,11 +155,39 @@ class Constant(DunderProvider):
     def evaluate(self, **variables):
         return self.value
 
+    def _evaluate(self, variables):
+        return self.__value
+
+    def compile(self):
+        value = self.__value
+        return lambda **variables: value
+
+    def derivative(self, name):
+        return Constant(0)
+
 
-class Variable(DunderProvider):
+class Variable(Leaf):
 
-    def __init__(self, name):
-        self.name = name
+    __slots__ = ('__name', '_variable_names', '__weakref__')
+    _instances = weakref.WeakValueDictionary()
+
+    def __new__(cls, name):
+        try:
+            return cls._instances[name]
+        except KeyError:
+            new_obj = super().__new__(cls)
+            new_obj.__name = name
+            new_obj._variable_names = frozenset((name,))
+            cls._instances[name] = new_obj
+            return new_obj
+
+    @property
+    def name(self):
+        return self.__name
+
+    @property
+    def variable_names(self):
+        return (self.__name,)
 
     def __str__(self):
         return self.name
@@ -97,98 +195,547 @@ class Variable(DunderProvider):
     def evaluate(self, **variables):
         return variables[self.name]
 
+    def _evaluate(self, variables):
+        return variables[self.__name]
+
+    def compile(self):
+        name = self.__name
+        return lambda **variables: variables[name]
+
+    def derivative(self, name):
+        return Constant(1 if name == self.__name else 0)
+
 
 class Operator:
 
-    objects = set()
+    # Operators are interned by (symbol, function) in a weak registry, so
+    # looking one up is a dictionary access and unused ones are dropped.
+    __slots__ = ('__symbol', '__func', '__weakref__')
+    _instances = weakref.WeakValueDictionary()
 
-    def __new__(cls, *args, **kwargs):
-        for ind, obj in enumerate(cls.objects):
-            if all(arg in obj.__dict__.values() for arg in args):
-                return obj
-        new_obj = super().__new__(cls)
-        return new_obj
+    def __new__(cls, symbol, func):
+        try:
+            return cls._instances[symbol, func]
+        except KeyError:
+            new_obj = super().__new__(cls)
+            new_obj.__symbol, new_obj.__func = symbol, func
+            cls._instances[symbol, func] = new_obj
+            return new_obj
 
-    def __init__(self, symbol, func):
-        self.symbol, self.func = symbol, func
-        self.objects.add(self)
+    @property
+    def symbol(self):
+        return self.__symbol
+
+    @property
+    def func(self):
+        return self.__func
 
     def __str__(self):
         return self.symbol
 
     def __call__(self, *args, **kwargs):
-        return self.func(*args, **kwargs)
+        return self.__func(*args, **kwargs)
+
+
+def as_node(operand):
+    if isinstance(operand, DunderProvider):
+        return operand
+    if isinstance(operand, (tuple, list)):
+        return Expression(operand)
+    return Constant(operand)
 
 
 class Expression(DunderProvider):
 
-    def __init__(self, expression):
-        self.expression = list(expression)
-        self._variable_names = set()
+    # Expressions are immutable and hash-consed: building the same
+    # (lhs, operator, rhs) triple twice gives back the same object, so
+    # shared subtrees are shared nodes and evaluation never writes to them.
+    __slots__ = ('__lhs', '__operator', '__rhs', '__node_count',
+                 '_variable_names', '__variable_names', '__strings',
+                 '__compiled', '__weakref__')
+    _instances = weakref.WeakValueDictionary()
+
+    def __new__(cls, expression):
+        lhs, oper, rhs = expression
+        key = (as_node(lhs), oper, as_node(rhs))
+        try:
+            return cls._instances[key]
+        except KeyError:
+            new_obj = super().__new__(cls)
+            new_obj.__lhs, new_obj.__operator, new_obj.__rhs = key
+            new_obj.__node_count = None
+            new_obj.__set_variable_names(key[0], key[2])
+            new_obj.__strings = {}
+            new_obj.__compiled = None
+            cls._instances[key] = new_obj
+            return new_obj
 
-    def stringify(self, expression):
-        for ind, exp in enumerate(expression):
-            if isinstance(exp, collections.Sequence):
-                expression[ind] = list(exp)
-                self.stringify(expression[ind])
-            else:
-                expression[ind] = str(expression[ind])
+    @property
+    def expression(self):
+        return (self.__lhs, self.__operator, self.__rhs)
 
-    def __str__(self):
-        str_ver = self.expression[:]
-        self.stringify(str_ver)
-        final_ver = str(str_ver)
-        while "'" in final_ver:
-            final_ver = final_ver.replace("'", '')
-        while "," in final_ver:
-            final_ver = final_ver.replace(",", '')
-        while "[" in final_ver:
-            final_ver = final_ver.replace("[", '(')
-        while "]" in final_ver:
-            final_ver = final_ver.replace("]", ')')
-        return final_ver
-
-    def get_variable_names(self, expression):
-        for exp in expression:
-            if isinstance(exp, Variable):
-                self._variable_names.add(exp.name)
-            elif isinstance(exp, collections.Sequence):
-                self.get_variable_names(exp)
+    @property
+    def lhs(self):
+        return self.__lhs
+
+    @property
+    def operator(self):
+        return self.__operator
+
+    @property
+    def rhs(self):
+        return self.__rhs
+
+    @property
+    def node_count(self):
+        # Distinct nodes, so a subtree used twice is counted once.
+        if self.__node_count is None:
+            order = self.postorder()
+            leaves = {operand for node in order
+                      for operand in (node.__lhs, node.__rhs)
+                      if not isinstance(operand, Expression)}
+            self.__node_count = len(order) + len(leaves)
+        return self.__node_count
+
+    def __set_variable_names(self, lhs, rhs):
+        # Combined from the operands' sets when the node is built. When one
+        # side adds nothing new the other side's objects are reused, so a
+        # long chain over a few variables shares a single set and tuple.
+        for first, second in ((lhs, rhs), (rhs, lhs)):
+            if second._variable_names <= first._variable_names:
+                self._variable_names = first._variable_names
+                self.__variable_names = first.variable_names
+                return
+        self._variable_names = lhs._variable_names | rhs._variable_names
+        self.__variable_names = tuple(self._variable_names)
 
     @property
     def variable_names(self):
-        self.get_variable_names(self.expression)
-        return tuple(self._variable_names)
-
-    def simplify(self, expr, **variables):
-        operands = []
-        for el in expr:
-            if isinstance(el, Operator):
-                oper = el
-            elif isinstance(el, Variable):
-                operands.append(variables[el.name])
-            elif isinstance(el, Constant):
-                operands.append(el.value)
-            elif isinstance(el, numbers.Number):
-                operands.append(el)
-            elif isinstance(el, Expression):
-                operands.append(self.evaluate_v2(el.expression, **variables))
-        return oper(*operands)
-
-    def evaluate_v2(self, expression, **variables):
-        if any(hasattr(x, '__iter__') for x in expression):
-            for ind, expr in enumerate(expression):
-                if hasattr(expr, '__iter__'):
-                    expression[ind] = list(expr)
-                    res = self.evaluate_v2(expression[ind], **variables)
-                    expression[ind] = res
-        else:
-            res = self.simplify(expression, **variables)
+        return self.__variable_names
 
-        return self.simplify(expression, **variables)
+    def __str__(self):
+        return self.to_string()
+
+    def to_string(self, minimal_parentheses=False):
+        # Rendered iteratively into one list of parts that is joined once.
+        # Only the requested root keeps its string: caching every subtree
+        # of a long chain would store quadratically many characters.
+        if minimal_parentheses not in self.__strings:
+            parts = []
+            stack = [(self, False)]
+            while stack:
+                node, parenthesize = stack.pop()
+                if isinstance(node, str):
+                    parts.append(node)
+                elif not isinstance(node, Expression):
+                    parts.append(str(node))
+                elif (node is not self and
+                      minimal_parentheses in node.__strings):
+                    text = node.__strings[minimal_parentheses]
+                    parts.append('({})'.format(text) if parenthesize else text)
+                else:
+                    lhs, rhs = node.__lhs, node.__rhs
+                    if minimal_parentheses:
+                        symbol = node.__operator.symbol
+                        lhs_parens = _needs_parentheses(symbol, lhs, False)
+                        rhs_parens = _needs_parentheses(symbol, rhs, True)
+                    else:
+                        lhs_parens = rhs_parens = True
+                    stack.extend(((')', False),) if parenthesize else ())
+                    stack.extend(((rhs, rhs_parens),
+                                  (' {} '.format(node.__operator), False),
+                                  (lhs, lhs_parens)))
+                    stack.extend((('(', False),) if parenthesize else ())
+            text = ''.join(parts)
+            self.__strings[minimal_parentheses] = text
+        text = self.__strings[minimal_parentheses]
+        return text if minimal_parentheses else '({})'.format(text)
+
+    def postorder(self):
+        # Every distinct subexpression once, operands before the expressions
+        # using them. Built with an explicit stack, so the depth of the tree
+        # is not limited by the recursion limit.
+        order, seen = [], set()
+        stack = [(self, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if expanded:
+                order.append(node)
+            elif node not in seen:
+                seen.add(node)
+                stack.append((node, True))
+                for operand in (node.__rhs, node.__lhs):
+                    if isinstance(operand, Expression):
+                        stack.append((operand, False))
+        return order
+
+    def fold(self, leaf, combine):
+        values = {}
+        for node in self.postorder():
+            lhs, rhs = node.__lhs, node.__rhs
+            values[node] = combine(node,
+                                   values[lhs] if lhs in values else leaf(lhs),
+                                   values[rhs] if rhs in values else leaf(rhs))
+        return values[self]
+
+    def get_variable_names(self, names):
+        names.update(self._variable_names)
+        return names
 
     def evaluate(self, **variables):
-        return self.evaluate_v2(self.expression,  **variables)
+        return self._evaluate(variables)
+
+    def _evaluate(self, variables):
+        values = {}
+        for node in self.postorder():
+            lhs, rhs = node.__lhs, node.__rhs
+            values[node] = node.__operator.func(
+                values[lhs] if lhs in values else lhs._evaluate(variables),
+                values[rhs] if rhs in values else rhs._evaluate(variables))
+        return values[self]
+
+    def evaluate_batch(self, **variables):
+        # Each operator runs once over whole columns.
+        columns, apply = _batch_columns(variables)
+        return _broadcast(
+            self.fold(lambda leaf: leaf._evaluate(columns),
+                      lambda node, lhs, rhs: apply(node.operator.func,
+                                                   lhs, rhs)),
+            columns)
+
+    def optimize(self, report=False):
+        # Rebuilding through the intern table also merges subexpressions
+        # that became equal after folding into shared nodes, which compile()
+        # and evaluate_batch() then compute only once. With report=True the
+        # node counts before and after are returned along with the result.
+        optimized = self.fold(lambda leaf: leaf,
+                              lambda node, lhs, rhs: simplify_node(
+                                  lhs, node.operator, rhs))
+        if report:
+            return optimized, self.node_count, optimized.node_count
+        return optimized
+
+    def derivative(self, name):
+        # Built bottom-up through simplify_node, so constant and identity
+        # terms are folded away as the derivative is assembled.
+        return self.fold(lambda leaf: leaf.derivative(name),
+                         lambda node, lhs, rhs: _differentiate(node, lhs,
+                                                               rhs))
+
+    def evaluate_with_gradient(self, **variables):
+        # Reverse mode: one forward pass for the values, then one backward
+        # pass that pushes every node's adjoint down to its operands.
+        order = self.postorder()
+        for node in order:
+            _check_differentiable(node.__operator)
+        values = {}
+        for node in order:
+            lhs, rhs = node.__lhs, node.__rhs
+            values[node] = node.__operator.func(
+                values[lhs] if lhs in values else lhs._evaluate(variables),
+                values[rhs] if rhs in values else rhs._evaluate(variables))
+
+        gradient = dict.fromkeys(self._variable_names, 0)
+        adjoints = {self: 1}
+        for node in reversed(order):
+            adjoint = adjoints.pop(node, 0)
+            lhs, rhs = node.__lhs, node.__rhs
+            lhs_value = values[lhs] if lhs in values else lhs._evaluate(
+                variables)
+            rhs_value = values[rhs] if rhs in values else rhs._evaluate(
+                variables)
+            partials = _partials(node.__operator.symbol, lhs_value, rhs_value)
+            for operand, partial in zip((lhs, rhs), partials):
+                if isinstance(operand, Expression):
+                    adjoints[operand] = (adjoints.get(operand, 0) +
+                                         adjoint * partial)
+                elif isinstance(operand, Variable):
+                    gradient[operand.name] += adjoint * partial
+        return values[self], gradient
+
+    def compile(self):
+        # Flatten the tree into straight-line code, one assignment per
+        # distinct subexpression, so that evaluating it is a single call
+        # with no dispatch on the node types. Nodes are immutable, so the
+        # result is kept for later calls.
+        if self.__compiled is not None:
+            return self.__compiled
+        namespace = {'variables': {}}
+        lines, leaves = [], {}
+        result = self.fold(
+            lambda leaf: _compile_leaf(leaf, namespace, leaves),
+            lambda node, lhs, rhs: _compile_node(node, lhs, rhs, namespace,
+                                                 lines))
+        variables = namespace.pop('variables')
+        source = ['def compiled(**variables):']
+        source.extend('    {} = variables[{!r}]'.format(local, name)
+                      for name, local in variables.items())
+        source.extend('    ' + line for line in lines)
+        source.append('    return ' + result)
+        exec('\n'.join(source), namespace)
+        self.__compiled = namespace['compiled']
+        return self.__compiled
+
+
+def _compile_node(node, lhs, rhs, namespace, lines):
+    oper = node.operator
+    name = '_t{}'.format(len(lines))
+    if OPERATOR_FUNCTIONS.get(oper.symbol) is oper.func:
+        lines.append('{} = {} {} {}'.format(name, lhs, oper.symbol, rhs))
+    else:
+        func = '_f{}'.format(len(lines))
+        namespace[func] = oper.func
+        lines.append('{} = {}({}, {})'.format(name, func, lhs, rhs))
+    return name
+
+
+def _compile_leaf(leaf, namespace, leaves):
+    if leaf not in leaves:
+        if isinstance(leaf, Variable):
+            leaves[leaf] = '_v{}'.format(len(leaves))
+            namespace['variables'][leaf.name] = leaves[leaf]
+        else:
+            leaves[leaf] = '_c{}'.format(len(leaves))
+            namespace[leaves[leaf]] = leaf.value
+    return leaves[leaf]
+
+
+def _needs_parentheses(symbol, child, right):
+    if not isinstance(child, Expression):
+        return False
+    if symbol not in PRECEDENCE or child.operator.symbol not in PRECEDENCE:
+        return True
+    if right:
+        return PRECEDENCE[child.operator.symbol] <= PRECEDENCE[symbol]
+    return PRECEDENCE[child.operator.symbol] < PRECEDENCE[symbol]
+
+
+def simplify_node(lhs, oper, rhs):
+    if isinstance(lhs, Constant) and isinstance(rhs, Constant):
+        try:
+            return Constant(oper(lhs.value, rhs.value))
+        except Exception:
+            # Leave it to fail at evaluation time, as it would unoptimized.
+            return Expression((lhs, oper, rhs))
+
+    if OPERATOR_FUNCTIONS.get(oper.symbol) is oper.func:
+        if oper.symbol == '+':
+            if _is_constant(lhs, 0):
+                return rhs
+            if _is_constant(rhs, 0):
+                return lhs
+        elif oper.symbol == '-' and _is_constant(rhs, 0):
+            return lhs
+        elif oper.symbol == '*':
+            if _is_constant(lhs, 0) or _is_constant(rhs, 1):
+                return lhs
+            if _is_constant(rhs, 0) or _is_constant(lhs, 1):
+                return rhs
+    return Expression((lhs, oper, rhs))
+
+
+def _is_constant(node, value):
+    return (isinstance(node, Constant) and
+            isinstance(node.value, numbers.Number) and node.value == value)
+
+
+def _check_differentiable(oper):
+    if OPERATOR_FUNCTIONS.get(oper.symbol) is not oper.func:
+        raise ValueError('Cannot differentiate custom operator {}'.format(
+            oper.symbol))
+
+
+def _build(lhs, symbol, rhs):
+    return simplify_node(lhs, DunderProvider.operator_factory(symbol), rhs)
+
+
+def _differentiate(node, lhs_derivative, rhs_derivative):
+    _check_differentiable(node.operator)
+    symbol, lhs, rhs = node.operator.symbol, node.lhs, node.rhs
+    if symbol in ('+', '-'):
+        return _build(lhs_derivative, symbol, rhs_derivative)
+    if symbol == '*':
+        return _build(_build(lhs_derivative, '*', rhs), '+',
+                      _build(lhs, '*', rhs_derivative))
+    if symbol == '/':
+        numerator = _build(_build(lhs_derivative, '*', rhs), '-',
+                           _build(lhs, '*', rhs_derivative))
+        return _build(numerator, '/', _build(rhs, '*', rhs))
+    if symbol == '//':
+        return Constant(0)
+    return _build(lhs_derivative, '-',
+                  _build(rhs_derivative, '*', _build(lhs, '//', rhs)))
+
+
+def _partials(symbol, lhs, rhs):
+    # Floor division is piecewise constant and a % b is a - b * (a // b).
+    if symbol == '+':
+        return 1, 1
+    if symbol == '-':
+        return 1, -1
+    if symbol == '*':
+        return rhs, lhs
+    if symbol == '/':
+        return 1 / rhs, -lhs / (rhs * rhs)
+    if symbol == '//':
+        return 0, 0
+    return 1, -(lhs // rhs)
+
+
+def _batch_columns(variables):
+    # NumPy arrays if any binding is one, plain lists otherwise.
+    if any(hasattr(value, '__array__') for value in variables.values()):
+        import numpy
+        return ({name: numpy.asarray(value)
+                 for name, value in variables.items()}, _apply_arrays)
+    return ({name: list(value) if isinstance(value, Iterable) and
+             not isinstance(value, (str, bytes)) else value
+             for name, value in variables.items()}, _apply_lists)
+
+
+def _broadcast(result, columns):
+    # A result that does not depend on any column, such as the constant
+    # left by optimize() or derivative(), still gets one value per row.
+    arrays = [value for value in columns.values()
+              if hasattr(value, '__array__')]
+    if arrays:
+        import numpy
+        shape = numpy.broadcast_shapes(*map(numpy.shape, arrays))
+        if numpy.shape(result) != shape:
+            return numpy.array(numpy.broadcast_to(result, shape))
+        return result
+    lengths = [len(value) for value in columns.values()
+               if isinstance(value, list)]
+    if lengths and not isinstance(result, list):
+        return [result] * lengths[0]
+    return result
+
+
+def _apply_lists(func, lhs, rhs):
+    lhs_column, rhs_column = isinstance(lhs, list), isinstance(rhs, list)
+    if not lhs_column and not rhs_column:
+        return func(lhs, rhs)
+    if lhs_column and rhs_column and len(lhs) != len(rhs):
+        raise ValueError('Columns of different lengths: {} and {}'.format(
+            len(lhs), len(rhs)))
+    return list(map(func, lhs if lhs_column else itertools.repeat(lhs),
+                    rhs if rhs_column else itertools.repeat(rhs)))
+
+
+def _apply_arrays(func, lhs, rhs):
+    import numpy
+    shape = numpy.broadcast_shapes(numpy.shape(lhs), numpy.shape(rhs))
+    try:
+        result = func(lhs, rhs)
+        if numpy.shape(result) == shape:
+            return result
+    except (TypeError, ValueError):
+        pass
+    # The operator does not broadcast, fall back to calling it per element.
+    result = numpy.frompyfunc(func, 2, 1)(lhs, rhs)
+    if isinstance(result, numpy.ndarray):
+        return numpy.array(result.tolist())
+    return result
+
+
+TOKENS = re.compile(r'''\s*(?:
+    (?P<number>(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][-+]?\d+)?)
+    |(?P<name>[A-Za-z_]\w*)
+    |(?P<operator>//|[-+*/%])
+    |(?P<paren>[()])
+    )''', re.VERBOSE)
+
+
+class ExpressionSyntaxError(Exception):
+    pass
+
+
+def tokenize(text):
+    position, end = 0, len(text.rstrip())
+    while position < end:
+        match = TOKENS.match(text, position)
+        if match is None:
+            position = end - len(text[position:end].lstrip())
+            raise ExpressionSyntaxError(
+                'Unexpected character {!r} at {}'.format(text[position],
+                                                         position))
+        yield match.lastgroup, match.group(match.lastgroup), match.start(
+            match.lastgroup)
+        position = match.end()
+
+
+@lru_cache(maxsize=1024)
+def parse_expression(text):
+    # Shunting-yard, so neither long chains nor deep nesting recurse.
+    # A minus in operand position negates a number literal and is read as
+    # (0 - operand) anywhere else.
+    operands, operators = [], []
+
+    def reduce():
+        symbol = operators.pop()
+        rhs = operands.pop()
+        if symbol == 'neg':
+            lhs, symbol = Constant(0), '-'
+        else:
+            lhs = operands.pop()
+        operands.append(Expression(
+            (lhs, DunderProvider.operator_factory(symbol), rhs)))
+
+    def precedence(symbol):
+        return 3 if symbol == 'neg' else PRECEDENCE.get(symbol, 0)
+
+    expect_operand, negate, position = True, False, 0
+    for kind, token, position in tokenize(text):
+        if expect_operand:
+            if kind == 'number':
+                value = int(token) if token.isdigit() else float(token)
+                operands.append(Constant(-value if negate else value))
+                negate, expect_operand = False, False
+                continue
+            if negate:
+                operators.append('neg')
+                negate = False
+            if kind == 'name':
+                operands.append(Variable(token))
+                expect_operand = False
+            elif token == '(':
+                operators.append(token)
+            elif token == '-':
+                negate = True
+            else:
+                raise ExpressionSyntaxError(
+                    'Expected an operand at {}, got {!r}'.format(
+                        position, token))
+        elif kind == 'operator':
+            while operators and precedence(operators[-1]) >= precedence(
+                    token):
+                reduce()
+            operators.append(token)
+            expect_operand = True
+        elif token == ')':
+            while operators and operators[-1] != '(':
+                reduce()
+            if not operators:
+                raise ExpressionSyntaxError(
+                    'Unmatched ) at {}'.format(position))
+            operators.pop()
+        else:
+            raise ExpressionSyntaxError(
+                'Expected an operator at {}, got {!r}'.format(
+                    position, token))
+
+    if expect_operand:
+        raise ExpressionSyntaxError('Unexpected end of expression')
+    while operators:
+        if operators[-1] == '(':
+            raise ExpressionSyntaxError('Unmatched (')
+        reduce()
+    return operands.pop()
+
+
+@lru_cache(maxsize=1024)
+def compile_expression(text):
+    return parse_expression(text).compile()
 
 
 def create_constant(value):
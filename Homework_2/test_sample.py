@@ -0,0 +1,211 @@
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import solution
+
+
+class TestExpressions(unittest.TestCase):
+    def setUp(self):
+        self.plus = solution.create_operator('+', lambda lhs, rhs: lhs + rhs)
+        self.minus = solution.create_operator('-', lambda lhs, rhs: lhs - rhs)
+        self.times = solution.create_operator('*', lambda lhs, rhs: lhs * rhs)
+        self.x = solution.create_variable('x')
+        self.y = solution.create_variable('y')
+        self.six = solution.create_constant(6)
+        self.nine = solution.create_constant(9)
+
+    def test_evaluate(self):
+        expression = solution.create_expression(
+            (self.six, self.times, ((self.x, self.minus, self.y),
+                                    self.plus, self.nine)))
+        self.assertEqual(expression.evaluate(x=5, y=2), 72)
+
+    def test_evaluation_does_not_modify_expression(self):
+        expression = solution.create_expression(
+            (self.x, self.plus, (self.y, self.times, self.nine)))
+        self.assertEqual(expression.evaluate(x=1, y=2), 19)
+        self.assertEqual(expression.evaluate(x=2, y=3), 29)
+        with ThreadPoolExecutor(4) as executor:
+            results = list(executor.map(
+                lambda value: expression.evaluate(x=value, y=value),
+                range(100)))
+        self.assertEqual(results, [10 * value for value in range(100)])
+
+    def test_nodes_are_shared(self):
+        self.assertIs(solution.create_variable('x'), self.x)
+        self.assertIs(solution.create_constant(6), self.six)
+        self.assertIs(
+            solution.create_expression((self.x, self.plus, (6, self.times,
+                                                            self.y))),
+            solution.create_expression((self.x, self.plus, (self.six,
+                                                            self.times,
+                                                            self.y))))
+        zero = solution.create_constant(0.0)
+        self.assertEqual(str(solution.create_constant(-0.0) + self.x),
+                         '(-0.0 + x)')
+        self.assertEqual(str(zero + self.x), '(0.0 + x)')
+        self.assertIsNot(solution.create_constant(0), zero)
+
+    def test_evaluate_batch(self):
+        expression = solution.create_expression(
+            (self.six, self.times, ((self.x, self.minus, self.y),
+                                    self.plus, self.nine)))
+        xs, ys = [5, 1, 3, 0], [2, 1, 4, 7]
+        self.assertEqual(
+            expression.evaluate_batch(x=xs, y=ys),
+            [expression.evaluate(x=x, y=y) for x, y in zip(xs, ys)])
+        self.assertEqual(expression.evaluate_batch(x=(1, 2), y=1), [54, 60])
+        self.assertEqual(
+            expression.evaluate_batch(x=range(1, 3), y=iter([1, 1])),
+            [54, 60])
+        self.assertEqual((self.x * 0).optimize().evaluate_batch(x=[1, 2, 3]),
+                         [0, 0, 0])
+        self.assertEqual((self.six + self.nine).evaluate_batch(x=[1, 2]),
+                         [15, 15])
+        with self.assertRaises(ValueError):
+            expression.evaluate_batch(x=[1, 2], y=[1, 2, 3])
+
+    def test_operators_are_interned(self):
+        self.assertIs((self.x + self.y).operator, (self.y + 1).operator)
+        self.assertIs(solution.create_operator('+', max),
+                      solution.create_operator('+', max))
+        self.assertIsNot(solution.create_operator('+', max),
+                         solution.create_operator('+', min))
+
+    def test_optimize(self):
+        expression = (self.x + 0) * (self.six + self.nine) + self.y * 1
+        optimized = expression.optimize()
+        self.assertIs(optimized, self.x * 15 + self.y)
+        self.assertEqual(expression.node_count, 11)
+        self.assertEqual(optimized.node_count, 5)
+        self.assertEqual(expression.optimize(report=True),
+                         (optimized, 11, 5))
+        shared = (self.x + self.y) * (self.x + self.y)
+        self.assertEqual(shared.node_count, 4)
+        merged = ((self.x + 0) * self.y + self.x * (self.y * 1))
+        self.assertEqual(merged.optimize(report=True),
+                         (self.x * self.y + self.x * self.y, 9, 4))
+        self.assertIs((self.x * 0 + self.y).optimize(), self.y)
+        self.assertEqual(
+            optimized.evaluate(x=2, y=3), expression.evaluate(x=2, y=3))
+        unfolded = solution.create_expression((self.six, self.plus, 0))
+        self.assertIs(unfolded.optimize(), self.six)
+        division = self.six / 0
+        self.assertIs(division.optimize(), division)
+
+    def test_optimized_leaves(self):
+        variable = (self.x * 0 + self.y).optimize()
+        self.assertEqual(variable.evaluate_batch(y=[1, 2]), [1, 2])
+        self.assertEqual(variable.to_string(True), 'y')
+        self.assertEqual(variable.evaluate_with_gradient(y=4), (4, {'y': 1}))
+        self.assertIs(variable.optimize(), self.y)
+        constant = (self.six + self.nine).optimize()
+        self.assertEqual(constant.to_string(), '15')
+        self.assertEqual(constant.evaluate_batch(x=[1, 2]), [15, 15])
+        self.assertEqual(constant.evaluate_batch(), 15)
+        self.assertEqual(constant.evaluate_with_gradient(), (15, {}))
+        self.assertEqual(constant.postorder(), [])
+
+    def test_str(self):
+        expression = solution.create_expression(
+            (self.six, self.times, ((self.x, self.minus, self.y),
+                                    self.plus, self.nine)))
+        self.assertEqual(str(expression), '(6 * ((x - y) + 9))')
+        self.assertEqual(expression.to_string(minimal_parentheses=True),
+                         '6 * (x - y + 9)')
+        odd = solution.create_variable('f(a, b)') - solution.create_constant(
+            '[1, 2]')
+        self.assertEqual(str(odd), '(f(a, b) - [1, 2])')
+        self.assertEqual(
+            (self.x - (self.y - self.x) * 2).to_string(True),
+            'x - (y - x) * 2')
+        self.assertEqual(str(self.x + (self.y + self.x)),
+                         '(x + (y + x))')
+
+    def test_deep_expressions(self):
+        expression = self.x
+        for i in range(5000):
+            expression = expression + self.y * i
+        self.assertEqual(expression.evaluate(x=1, y=2), 1 + 2 * 4999 * 2500)
+        self.assertEqual(sorted(expression.variable_names), ['x', 'y'])
+        self.assertEqual(expression.compile()(x=1, y=2),
+                         expression.evaluate(x=1, y=2))
+
+    def test_variable_names(self):
+        expression = solution.create_expression(
+            (self.six, self.times, ((self.x, self.minus, self.y),
+                                    self.plus, self.nine)))
+        self.assertEqual(sorted(expression.variable_names), ['x', 'y'])
+        self.assertEqual(expression.variable_names,
+                         expression.variable_names)
+        self.assertEqual((self.six + 1).variable_names, ())
+        chain = self.x + self.x + self.x
+        self.assertIs(chain.variable_names, (self.x + self.x).variable_names)
+        self.assertEqual((chain * 0).optimize().variable_names, ())
+
+    def test_parse_expression(self):
+        expression = solution.parse_expression('6 * ((x - y) + 9)')
+        self.assertEqual(str(expression), '(6 * ((x - y) + 9))')
+        self.assertEqual(expression.evaluate(x=5, y=2), 72)
+        self.assertIs(solution.parse_expression('6 * ((x - y) + 9)'),
+                      expression)
+        self.assertEqual(
+            solution.parse_expression('x - y - 2 * -x % 3').evaluate(
+                x=4, y=1), 4 - 1 - 2 * -4 % 3)
+        self.assertEqual(
+            solution.parse_expression('1.5 // -(x)').evaluate(x=0.25), -6)
+        for source in ['x - y - z', 'x - (y - z) * 2', 'x // y % 3 + z']:
+            self.assertEqual(
+                solution.parse_expression(source).to_string(True), source)
+        self.assertEqual(
+            solution.compile_expression('x * (y + 1)')(x=2, y=3), 8)
+        for source in ['x', '(x)', '6']:
+            leaf = solution.parse_expression(source)
+            self.assertEqual(leaf.to_string(True), source.strip('()'))
+            self.assertEqual(leaf.evaluate_with_gradient(x=1)[0],
+                             leaf.evaluate(x=1))
+        self.assertEqual(
+            solution.parse_expression('x').evaluate_with_gradient(x=1),
+            (1, {'x': 1}))
+        for source in ['x +', '(x', 'x)', 'x y', '3 $ 4', '', '* x']:
+            with self.assertRaises(solution.ExpressionSyntaxError):
+                solution.parse_expression(source)
+
+    def test_derivative(self):
+        expression = solution.parse_expression(
+            '3 * x * x - x / y + y % x + 7 // y')
+        self.assertEqual(
+            expression.derivative('x').to_string(True),
+            '3 * x + 3 * x - y / (y * y) + (0 - y // x)')
+        variables = {'x': 2.5, 'y': 4.0}
+        value, gradient = expression.evaluate_with_gradient(**variables)
+        self.assertEqual(value, expression.evaluate(**variables))
+        for name in ('x', 'y'):
+            self.assertAlmostEqual(
+                gradient[name],
+                expression.derivative(name).evaluate(**variables))
+        self.assertEqual(self.x.derivative('x').value, 1)
+        second = solution.parse_expression('x * x').derivative(
+            'x').derivative('x')
+        self.assertEqual(second.to_string(), '2')
+        self.assertEqual(second.evaluate_batch(x=[1, 2]), [2, 2])
+        slope = solution.parse_expression('3 * x + y').derivative('x')
+        self.assertEqual(slope.to_string(True), '3')
+        self.assertEqual(slope.evaluate_with_gradient(), (3, {}))
+        with self.assertRaises(ValueError):
+            solution.create_expression(
+                (self.x, self.plus, self.y)).derivative('x')
+
+    def test_compile(self):
+        expression = solution.create_expression(
+            (self.six, self.times, ((self.x, self.minus, self.y),
+                                    self.plus, self.nine)))
+        compiled = expression.compile()
+        self.assertEqual(compiled(x=5, y=2), 72)
+        self.assertEqual(compiled(x=1, y=1), 54)
+        self.assertEqual(((self.x + 3) * self.y - 6 / self.x).compile()(
+            x=2, y=4), 17.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
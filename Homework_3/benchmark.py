@@ -0,0 +1,64 @@
+import random
+import time
+
+import solution
+
+
+def power_law_graph(size, follows_per_user=3, seed=0):
+    # Preferential attachment: every new user follows existing users picked
+    # with probability proportional to how often they were picked before,
+    # and is followed back by one of them half of the time.
+    rng = random.Random(seed)
+    graph = solution.SocialGraph()
+    users = [solution.User('user {}'.format(i)) for i in range(size)]
+    for user in users:
+        graph.add_user(user)
+    picks = [user.uuid for user in users[:follows_per_user]]
+    for user in users[follows_per_user:]:
+        for followee in {rng.choice(picks) for i in range(follows_per_user)}:
+            graph.follow(user.uuid, followee)
+            if rng.random() < 0.5:
+                graph.follow(followee, user.uuid)
+            picks.extend((followee, user.uuid))
+    return graph, [user.uuid for user in users]
+
+
+def forward_distance(graph, from_user_uuid, to_user_uuid):
+    for followed, level in graph.traverse(from_user_uuid):
+        if followed == to_user_uuid:
+            return level
+    raise solution.UsersNotConnectedError
+
+
+def measure(function, graph, pairs):
+    results, nodes, edges = [], 0, 0
+    start = time.perf_counter()
+    for from_user_uuid, to_user_uuid in pairs:
+        try:
+            results.append(function(from_user_uuid, to_user_uuid))
+        except solution.UsersNotConnectedError:
+            results.append(None)
+        nodes += graph.traversal_stats.nodes
+        edges += graph.traversal_stats.edges
+    return results, time.perf_counter() - start, nodes, edges
+
+
+def main():
+    for size in (10000, 100000):
+        graph, uuids = power_law_graph(size)
+        rng = random.Random(size)
+        pairs = [tuple(rng.sample(uuids, 2)) for i in range(100)]
+        forward = measure(lambda *pair: forward_distance(graph, *pair),
+                          graph, pairs)
+        bidirectional = measure(graph.bidirectional_distance, graph, pairs)
+        assert forward[0] == bidirectional[0]
+        print('{} users, {} queries'.format(size, len(pairs)))
+        for name, (results, seconds, nodes, edges) in (
+                ('forward', forward), ('bidirectional', bidirectional)):
+            print('  {:<14} {:8.3f}s {:>12} nodes {:>12} edges'.format(
+                name, seconds, nodes, edges))
+        print('  speedup {:.1f}x'.format(forward[1] / bidirectional[1]))
+
+
+if __name__ == '__main__':
+    main()
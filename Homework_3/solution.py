@@ -1,8 +1,13 @@
 import uuid
 import math
+import heapq
 import datetime
 import functools
-from collections import deque, defaultdict
+import itertools
+from array import array
+from bisect import bisect_left
+from operator import attrgetter
+from collections import deque, defaultdict, OrderedDict
 
 
 class User:
@@ -11,6 +16,7 @@ class User:
         self.full_name = full_name
         self.__uuid = uuid.uuid4()
         self.posts = deque([], 50)
+        self.listeners = []
 
     @property
     def uuid(self):
@@ -18,25 +24,141 @@ class User:
 
     def add_post(self, post_content):
         date_time = datetime.datetime.now()
-        self.posts.append(Post(self.uuid, date_time, post_content))
+        evicted = None
+        if len(self.posts) == self.posts.maxlen:
+            evicted = self.posts[0]
+        post = Post(self.uuid, date_time, post_content)
+        self.posts.append(post)
+        for listener in self.listeners:
+            listener(post, evicted)
 
     def get_post(self):
-        for i in range(self.posts.maxlen):
+        for i in range(len(self.posts)):
             yield self.posts[i]
 
 
 class Post:
 
+    # Breaks ties between posts published within the same clock tick, so
+    # feeds have a strict order to paginate over.
+    _sequence = itertools.count()
+
     def __init__(self, author, published_at, content):
         self.author = author
         self.published_at = published_at
         self.content = content
+        self.sequence = next(Post._sequence)
+
+
+class CachedFeed:
+
+    def __init__(self, posts, complete):
+        self.posts = deque(posts)
+        self.complete = complete
+
+
+class TraversalStats:
+
+    def __init__(self):
+        self.nodes = 0
+        self.edges = 0
+
+
+class AdjacencyIndex:
+
+    # Edges between dense integer ids in CSR form: the targets of node i
+    # are the sorted slice targets[offsets[i]:offsets[i + 1]]. Edges added
+    # or removed since the last compaction are kept in small per-node sets
+    # and folded into the arrays once they outnumber a quarter of the
+    # stored edges, so compaction stays amortized linear.
+
+    def __init__(self):
+        self.offsets = array('I', [0])
+        self.targets = array('I')
+        self.added = {}
+        self.removed = {}
+        self.pending = 0
+
+    def bounds(self, node):
+        if node + 1 < len(self.offsets):
+            return self.offsets[node], self.offsets[node + 1]
+        return 0, 0
+
+    def stored(self, node, target):
+        low, high = self.bounds(node)
+        index = bisect_left(self.targets, target, low, high)
+        return index < high and self.targets[index] == target
+
+    def __contains__(self, edge):
+        node, target = edge
+        if target in self.added.get(node, ()):
+            return True
+        return target not in self.removed.get(node, ()) and \
+            self.stored(node, target)
+
+    def add(self, node, target):
+        if (node, target) in self:
+            return
+        removed = self.removed.get(node)
+        if removed and target in removed:
+            removed.remove(target)
+            if not removed:
+                del self.removed[node]
+        else:
+            self.added.setdefault(node, set()).add(target)
+        self.mutated()
+
+    def remove(self, node, target):
+        if (node, target) not in self:
+            return
+        added = self.added.get(node)
+        if added and target in added:
+            added.remove(target)
+            if not added:
+                del self.added[node]
+        else:
+            self.removed.setdefault(node, set()).add(target)
+        self.mutated()
+
+    def neighbours(self, node):
+        low, high = self.bounds(node)
+        targets = self.targets[low:high]
+        removed = self.removed.get(node)
+        if removed:
+            targets = [target for target in targets if target not in removed]
+        added = self.added.get(node)
+        if added:
+            return itertools.chain(targets, added)
+        return targets
+
+    def degree(self, node):
+        low, high = self.bounds(node)
+        return high - low - len(self.removed.get(node, ())) + \
+            len(self.added.get(node, ()))
+
+    def mutated(self):
+        self.pending += 1
+        if self.pending > len(self.targets) // 4 + 64:
+            self.compact()
+
+    def compact(self):
+        size = max(len(self.offsets) - 1, max(self.added, default=-1) + 1)
+        offsets, targets = array('I', [0]), array('I')
+        for node in range(size):
+            targets.extend(sorted(self.neighbours(node)))
+            offsets.append(len(targets))
+        self.offsets, self.targets = offsets, targets
+        self.added, self.removed = {}, {}
+        self.pending = 0
+
+
+FEED_ORDER = attrgetter('published_at', 'sequence')
 
 
 def user_checker_arg_modifier(arg_change=False):
     def deco(func):
         @functools.wraps(func)
-        def wrapper(*args):
+        def wrapper(*args, **kwargs):
             new_args = []
             new_args.append(args[0])
             for arg in args[1:]:
@@ -48,25 +170,52 @@ def user_checker_arg_modifier(arg_change=False):
                 elif isinstance(arg, int):
                     new_args.append(arg)
             if arg_change:
-                return func(*new_args)
-            return func(*args)
+                return func(*new_args, **kwargs)
+            return func(*args, **kwargs)
         return wrapper
     return deco
 
 
 class SocialGraph:
 
-    def __init__(self):
+    def __init__(self, feed_cache_users=0, feed_cache_length=100,
+                 fanout_threshold=1000):
         self.users = set()
         self.uuid_to_users = dict()
-        self.follows = defaultdict(set)
-        self.followed_by = defaultdict(set)
+        # Users get a dense integer id the first time they are added, and
+        # the follow graph is stored over those ids in both directions.
+        self.ids = dict()
+        self.uuids = []
+        self.follows = AdjacencyIndex()
+        self.followed_by = AdjacencyIndex()
+        self.traversal_stats = TraversalStats()
+        # Materialized feeds for up to feed_cache_users readers, evicted in
+        # LRU order. They hold the newest feed_cache_length posts of the
+        # followees with at most fanout_threshold followers, pushed in as
+        # they are published; posts of more popular users are still merged
+        # in when the feed is read.
+        self.feed_cache = OrderedDict()
+        self.feed_cache_users = feed_cache_users
+        self.feed_cache_length = feed_cache_length
+        self.fanout_threshold = fanout_threshold
+        self.feed_cache_hits = 0
+        self.feed_cache_misses = 0
 
     def add_user(self, user):
         if user in self.users:
             raise UserAlreadyExistsError
         self.users.add(user)
         self.uuid_to_users[user.uuid] = user
+        if user.uuid not in self.ids:
+            self.ids[user.uuid] = len(self.uuids)
+            self.uuids.append(user.uuid)
+        else:
+            # Back after delete_user: the feeds of their followers were
+            # rebuilt without their posts.
+            for follower in self.followers_of(user.uuid):
+                self.feed_cache.pop(follower, None)
+        if self.feed_cache_users:
+            user.listeners.append(self.push_post)
 
     @user_checker_arg_modifier()
     def get_user(self, user_uuid):
@@ -76,103 +225,234 @@ class SocialGraph:
     def delete_user(self, user_uuid):
         self.users.remove(user_uuid)
         del self.uuid_to_users[user_uuid.uuid]
+        if self.push_post in user_uuid.listeners:
+            user_uuid.listeners.remove(self.push_post)
+        self.feed_cache.pop(user_uuid.uuid, None)
+        for follower in self.followers_of(user_uuid.uuid):
+            self.feed_cache.pop(follower, None)
 
     @user_checker_arg_modifier()
     def follow(self, follower, followee):
-        self.follows[follower].add(followee)
-        self.followed_by[followee].add(follower)
+        pushed = self.is_pushed(followee)
+        follower_id, followee_id = self.ids[follower], self.ids[followee]
+        self.follows.add(follower_id, followee_id)
+        self.followed_by.add(followee_id, follower_id)
+        self.invalidate_feeds(follower, followee, pushed)
 
     @user_checker_arg_modifier()
     def unfollow(self, follower, followee):
-        try:
-            self.follows[follower].remove(followee)
-            self.followed_by[followee].remove(follower)
-        except KeyError:
-            pass
+        pushed = self.is_pushed(followee)
+        follower_id, followee_id = self.ids[follower], self.ids[followee]
+        self.follows.remove(follower_id, followee_id)
+        self.followed_by.remove(followee_id, follower_id)
+        self.invalidate_feeds(follower, followee, pushed)
+
+    def is_pushed(self, user_uuid):
+        return self.followed_by.degree(self.ids[user_uuid]) <= \
+            self.fanout_threshold
+
+    def following_of(self, user_uuid):
+        return {self.uuids[followed]
+                for followed in self.follows.neighbours(self.ids[user_uuid])}
+
+    def followers_of(self, user_uuid):
+        return {self.uuids[follower] for follower
+                in self.followed_by.neighbours(self.ids[user_uuid])}
+
+    def invalidate_feeds(self, follower, followee, was_pushed):
+        self.feed_cache.pop(follower, None)
+        if was_pushed != self.is_pushed(followee):
+            for reader in self.followers_of(followee):
+                self.feed_cache.pop(reader, None)
+
+    def push_post(self, post, evicted):
+        if not self.is_pushed(post.author):
+            return
+        for follower in self.followers_of(post.author):
+            cached = self.feed_cache.get(follower)
+            if cached is None:
+                continue
+            cached.posts.appendleft(post)
+            if evicted is not None and evicted in cached.posts:
+                cached.posts.remove(evicted)
+            if len(cached.posts) > self.feed_cache_length:
+                cached.posts.pop()
+                cached.complete = False
 
     @user_checker_arg_modifier()
     def is_following(self, follower, followee):
-        return followee in self.follows[follower]
+        return (self.ids[follower], self.ids[followee]) in self.follows
 
     @user_checker_arg_modifier()
     def followers(self, user_uuid):
-        return self.followed_by[user_uuid]
+        return self.followers_of(user_uuid)
 
     @user_checker_arg_modifier()
     def following(self, user_uuid):
-        return self.follows[user_uuid]
+        return self.following_of(user_uuid)
 
     @user_checker_arg_modifier()
     def friends(self, user_uuid):
-        return self.follows[user_uuid] & self.followed_by[user_uuid]
-
-    def get_distances(self, user_uuid):
+        return self.following_of(user_uuid) & self.followers_of(user_uuid)
+
+    def traverse(self, user_uuid, max_depth=None):
+        # Breadth-first over follows, yielding (user, distance) the moment
+        # a user is first reached, so callers can stop early. Users at
+        # max_depth are reported but not expanded. The start is not marked
+        # as visited up front: it is reported again if a cycle leads back.
+        stats = self.traversal_stats = TraversalStats()
         visited = set()
-        distances = defaultdict(set)
-        queue = []
-        queue.append((user_uuid, 0))
+        queue = deque([(self.ids[user_uuid], 0)])
 
         while queue:
-            current = queue[0][0]
-            level = queue[0][1] + 1
-            for followed in self.follows[current]:
-                if followed not in distances:
-                    distances[level].add(followed)
+            current, level = queue.popleft()
+            stats.nodes += 1
+            if level == max_depth:
+                continue
+            for followed in self.follows.neighbours(current):
+                stats.edges += 1
                 if followed not in visited:
-                    queue.append((followed, level))
                     visited.add(followed)
-            queue.pop(0)
+                    yield self.uuids[followed], level + 1
+                    queue.append((followed, level + 1))
 
+    def get_distances(self, user_uuid, max_depth=None):
+        distances = defaultdict(set)
+        for followed, level in self.traverse(user_uuid, max_depth):
+            distances[level].add(followed)
         return distances
 
     @user_checker_arg_modifier()
     def max_distance(self, user_uuid):
-        if not self.follows[user_uuid]:
+        if not self.follows.degree(self.ids[user_uuid]):
             return math.inf
 
         distances = self.get_distances(user_uuid)
         return max(distances.keys())
 
+    def bidirectional_distance(self, from_user_uuid, to_user_uuid):
+        # Grows a layer at a time from both ends, following follows from the
+        # source and followed_by from the target, always on the side with
+        # the smaller frontier. The first layer that meets the other side
+        # already contains a shortest path.
+        stats = self.traversal_stats = TraversalStats()
+        source, target = self.ids[from_user_uuid], self.ids[to_user_uuid]
+        forward, backward = {source: 0}, {target: 0}
+        frontiers = {'forward': [source], 'backward': [target]}
+
+        while frontiers['forward'] and frontiers['backward']:
+            if len(frontiers['forward']) <= len(frontiers['backward']):
+                side, seen, other, edges = ('forward', forward, backward,
+                                            self.follows)
+            else:
+                side, seen, other, edges = ('backward', backward, forward,
+                                            self.followed_by)
+            best, next_frontier = None, []
+            for current in frontiers[side]:
+                stats.nodes += 1
+                for user in edges.neighbours(current):
+                    stats.edges += 1
+                    if user in seen:
+                        continue
+                    seen[user] = seen[current] + 1
+                    next_frontier.append(user)
+                    if user in other:
+                        distance = seen[user] + other[user]
+                        best = distance if best is None else min(best,
+                                                                 distance)
+            if best is not None:
+                return best
+            frontiers[side] = next_frontier
+        raise UsersNotConnectedError
+
     @user_checker_arg_modifier()
     def min_distance(self, from_user_uuid, to_user_uuid):
-        if not self.follows[from_user_uuid]:
+        if not self.follows.degree(self.ids[from_user_uuid]):
             raise UsersNotConnectedError
 
-        visited = set()
-        queue = []
-        queue.append((from_user_uuid, 0))
-
-        while queue:
-            current = queue[0][0]
-            level = queue[0][1] + 1
-            for followed in self.follows[current]:
-                if followed == to_user_uuid:
-                    return level
-                if followed not in visited:
-                    queue.append((followed, level))
-                    visited.add(followed)
-            queue.pop(0)
-        else:
-            raise UsersNotConnectedError
+        if from_user_uuid != to_user_uuid:
+            return self.bidirectional_distance(from_user_uuid, to_user_uuid)
+        # The distance from a user to themselves is their shortest cycle.
+        for followed, level in self.traverse(from_user_uuid):
+            if followed == to_user_uuid:
+                return level
+        raise UsersNotConnectedError
 
     @user_checker_arg_modifier()
     def nth_layer_followings(self, user_uuid, n):
-        if not self.follows[user_uuid]:
+        if not self.follows.degree(self.ids[user_uuid]):
             return set()
 
-        distances = self.get_distances(user_uuid)
-        try:
-            return distances[n]
-        except KeyError:
-            return set()
+        return self.get_distances(user_uuid, n)[n]
+
+    def timeline(self, user_uuid, before=None):
+        # Follow edges outlive delete_user, so a deleted followee is
+        # simply left out of the feeds.
+        if user_uuid not in self.uuid_to_users:
+            return iter(())
+        posts = reversed(self.uuid_to_users[user_uuid].posts)
+        if before is not None:
+            posts = itertools.dropwhile(
+                lambda post: FEED_ORDER(post) >= before, posts)
+        return posts
+
+    def cached_timeline(self, user_uuid, before, needed):
+        # The merged timeline of every pushed followee, served from the
+        # cache when it holds enough posts, or None when it does not.
+        cached = self.feed_cache.get(user_uuid)
+        hit = cached is not None
+        if cached is None:
+            pushed = [self.timeline(followed)
+                      for followed in self.following_of(user_uuid)
+                      if self.is_pushed(followed)]
+            posts = list(itertools.islice(
+                heapq.merge(*pushed, key=FEED_ORDER, reverse=True),
+                self.feed_cache_length + 1))
+            cached = CachedFeed(posts[:self.feed_cache_length],
+                                len(posts) <= self.feed_cache_length)
+            self.feed_cache[user_uuid] = cached
+            if len(self.feed_cache) > self.feed_cache_users:
+                self.feed_cache.popitem(last=False)
+        self.feed_cache.move_to_end(user_uuid)
+
+        posts = iter(cached.posts)
+        if before is not None:
+            posts = itertools.dropwhile(
+                lambda post: FEED_ORDER(post) >= before, posts)
+        posts = list(itertools.islice(posts, needed))
+        if len(posts) < needed and not cached.complete:
+            self.feed_cache_misses += 1
+            return None
+        if hit:
+            self.feed_cache_hits += 1
+        else:
+            self.feed_cache_misses += 1
+        return posts
 
     @user_checker_arg_modifier()
-    def generate_feed(self, user_uuid, offset=0, limit=10):
-        latest_posts = []
-        for followed in self.follows[user_uuid]:
-            latest_posts.extend(self.uuid_to_users[followed].posts)
-        latest_posts.sort(key=lambda x: x.published_at)
-        return latest_posts[offset + 1: offset + limit]
+    def generate_feed(self, user_uuid, offset=0, limit=10, *, before=None):
+        # Every timeline is already in publishing order, so the feed is a
+        # lazy merge of them read newest first; only offset + limit posts
+        # are ever taken off the heap. Passing the last post seen (or a
+        # published_at datetime) as before= continues from there instead.
+        if isinstance(before, Post):
+            before = FEED_ORDER(before)
+        elif before is not None:
+            before = (before, -1)
+
+        cached = None
+        if self.feed_cache_users:
+            cached = self.cached_timeline(user_uuid, before, offset + limit)
+        if cached is None:
+            timelines = [self.timeline(followed, before)
+                         for followed in self.following_of(user_uuid)]
+        else:
+            timelines = [cached]
+            timelines.extend(self.timeline(followed, before)
+                             for followed in self.following_of(user_uuid)
+                             if not self.is_pushed(followed))
+        feed = heapq.merge(*timelines, key=FEED_ORDER, reverse=True)
+        return list(itertools.islice(feed, offset, offset + limit))
 
 
 class UserAlreadyExistsError(Exception):
@@ -1,4 +1,5 @@
 import datetime
+import random
 import unittest
 
 import solution
@@ -40,6 +41,155 @@ class TestSocialGraph(unittest.TestCase):
         self.assertIn(self.eric.uuid, self.graph.friends(self.terry.uuid))
         self.assertIn(self.terry.uuid, self.graph.friends(self.eric.uuid))
 
+    def test_feed_pagination(self):
+        self.graph.follow(self.terry.uuid, self.eric.uuid)
+        self.graph.follow(self.terry.uuid, self.graham.uuid)
+        for i in range(10):
+            self.eric.add_post(str(i))
+            self.graham.add_post(str(10 + i))
+        feed = [post.content
+                for post in self.graph.generate_feed(self.terry.uuid, 0, 20)]
+        page = self.graph.generate_feed(self.terry.uuid, 0, 7)
+        pages = [post.content for post in page]
+        while page:
+            page = self.graph.generate_feed(self.terry.uuid, 0, 7,
+                                            before=page[-1])
+            pages.extend(post.content for post in page)
+        self.assertEqual(pages, feed)
+        self.assertEqual(feed[:2], ['19', '9'])
+        self.assertEqual(
+            [post.content
+             for post in self.graph.generate_feed(self.terry.uuid, 18, 5)],
+            ['10', '0'])
+        self.assertEqual(
+            self.graph.generate_feed(self.terry.uuid, 0, 20,
+                                     before=datetime.datetime.max),
+            self.graph.generate_feed(self.terry.uuid, 0, 20))
+
+    def test_feed_cache(self):
+        for seed in range(5):
+            self.check_feed_cache(random.Random(seed))
+
+    def check_feed_cache(self, rng):
+        users = [solution.User(str(i)) for i in range(12)]
+        cached = solution.SocialGraph(feed_cache_users=4,
+                                      feed_cache_length=15,
+                                      fanout_threshold=3)
+        plain = solution.SocialGraph()
+        for user in users:
+            cached.add_user(user)
+            plain.add_user(user)
+        deleted = []
+        for step in range(600):
+            action = rng.random()
+            present = [user for user in users if user not in deleted]
+            reader, poster = rng.choice(present).uuid, rng.choice(present)
+            author = poster.uuid
+            if action < 0.1:
+                cached.follow(reader, author)
+                plain.follow(reader, author)
+            elif action < 0.15:
+                cached.unfollow(reader, author)
+                plain.unfollow(reader, author)
+            elif action < 0.18 and deleted:
+                user = deleted.pop(rng.randrange(len(deleted)))
+                cached.add_user(user)
+                plain.add_user(user)
+            elif action < 0.2 and len(present) > 2:
+                cached.delete_user(author)
+                plain.delete_user(author)
+                deleted.append(poster)
+            elif action < 0.6:
+                rng.choice(users).add_post(str(step))
+            else:
+                offset, limit = rng.randrange(20), rng.randrange(1, 10)
+                self.assertEqual(
+                    cached.generate_feed(reader, offset, limit),
+                    plain.generate_feed(reader, offset, limit))
+        self.assertGreater(cached.feed_cache_hits, 0)
+        self.assertGreater(cached.feed_cache_misses, 0)
+        self.assertLessEqual(len(cached.feed_cache), 4)
+
+    def test_feed_after_delete(self):
+        for graph in (solution.SocialGraph(),
+                      solution.SocialGraph(feed_cache_users=2)):
+            reader, gone, kept = (solution.User(name)
+                                  for name in ('reader', 'gone', 'kept'))
+            for user in (reader, gone, kept):
+                graph.add_user(user)
+            graph.follow(reader.uuid, gone.uuid)
+            graph.follow(reader.uuid, kept.uuid)
+            gone.add_post('gone')
+            kept.add_post('kept')
+            graph.generate_feed(reader.uuid)
+            graph.delete_user(gone.uuid)
+            self.assertEqual(
+                [post.content for post in graph.generate_feed(reader.uuid)],
+                ['kept'])
+            graph.add_user(gone)
+            gone.add_post('back')
+            self.assertEqual(
+                [post.content for post in graph.generate_feed(reader.uuid)],
+                ['back', 'kept', 'gone'])
+
+    def test_adjacency_compaction(self):
+        rng = random.Random(3)
+        users = [solution.User(str(i)) for i in range(30)]
+        for user in users:
+            self.graph.add_user(user)
+        expected = {user.uuid: set() for user in users}
+        for step in range(2000):
+            follower, followee = (rng.choice(users).uuid,
+                                  rng.choice(users).uuid)
+            if rng.random() < 0.7:
+                self.graph.follow(follower, followee)
+                expected[follower].add(followee)
+            else:
+                self.graph.unfollow(follower, followee)
+                expected[follower].discard(followee)
+        self.assertLess(self.graph.follows.pending,
+                        len(self.graph.follows.targets) // 4 + 65)
+        for user in users:
+            self.assertEqual(self.graph.following(user.uuid),
+                             expected[user.uuid])
+            self.assertEqual(
+                self.graph.followers(user.uuid),
+                {uuid for uuid, followed in expected.items()
+                 if user.uuid in followed})
+
+    def test_traversal(self):
+        self.graph.follow(self.terry.uuid, self.eric.uuid)
+        self.graph.follow(self.eric.uuid, self.graham.uuid)
+        self.graph.follow(self.graham.uuid, self.john.uuid)
+        self.graph.follow(self.john.uuid, self.michael.uuid)
+        self.assertEqual(
+            self.graph.nth_layer_followings(self.terry.uuid, 2),
+            {self.graham.uuid})
+        self.assertEqual(self.graph.traversal_stats.nodes, 3)
+        self.assertEqual(self.graph.traversal_stats.edges, 2)
+        self.assertEqual(
+            self.graph.min_distance(self.terry.uuid, self.michael.uuid), 4)
+        self.assertEqual(self.graph.max_distance(self.eric.uuid), 3)
+
+    def test_min_distance_matches_forward_search(self):
+        rng = random.Random(4)
+        users = [solution.User(str(i)) for i in range(60)]
+        for user in users:
+            self.graph.add_user(user)
+        for i in range(150):
+            self.graph.follow(rng.choice(users).uuid, rng.choice(users).uuid)
+        for user in users[:20]:
+            distances = {followed: level for followed, level
+                         in self.graph.traverse(user.uuid)}
+            for other in users:
+                if other.uuid in distances:
+                    self.assertEqual(
+                        self.graph.min_distance(user.uuid, other.uuid),
+                        distances[other.uuid])
+                else:
+                    with self.assertRaises(solution.UsersNotConnectedError):
+                        self.graph.min_distance(user.uuid, other.uuid)
+
 
 class TestUser(unittest.TestCase):
     def setUp(self):